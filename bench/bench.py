@@ -0,0 +1,149 @@
+"""Offline benchmark of audio.py and video.py against local stand-ins for Azure OpenAI, Speech and the avatar API.
+
+Generates synthetic decks, runs the scripts against the fakes in a separate process per
+run and reports throughput, peak RSS and save I/O:
+
+    python bench/bench.py --script audio --slides 10 100 500 -- --local-ssml
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from pptx import Presentation
+
+import fakes
+
+TOPICS = ["storage accounts", "virtual networks", "identity", "monitoring", "containers", "databases",
+          "functions", "key vault", "load balancing", "backup"]
+
+
+def make_deck(path, slides, url_ratio=0.3, duplicate_ratio=0.1, docs_url=None, seed=0):
+    """Write a deck of slides slides whose notes ask about a topic, some grounded on a url, some duplicated."""
+    rng = random.Random(seed)
+    presentation = Presentation()
+    notes = []
+    for i in range(slides):
+        if notes and rng.random() < duplicate_ratio:
+            text = rng.choice(notes)
+        else:
+            topic = TOPICS[i % len(TOPICS)]
+            text = f"Explain {topic} (part {i + 1}) to new administrators, with the settings that matter most."
+            if docs_url and rng.random() < url_ratio:
+                text += f" See {docs_url}/docs/{i % 20} for details."
+        notes.append(text)
+
+        slide = presentation.slides.add_slide(presentation.slide_layouts[5])
+        slide.shapes.title.text = f"Slide {i + 1}"
+        slide.notes_slide.notes_text_frame.text = text
+    presentation.save(path)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--script", choices=["audio", "video"], default="audio")
+    parser.add_argument("--slides", type=int, nargs="+", default=[10, 100], help="deck sizes to run (default: 10 100)")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="run every deck this many times in the same directory, later runs hit the cache")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--url-ratio", type=float, default=0.3, help="fraction of slides whose notes link a page")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.1, help="fraction of slides repeating earlier notes")
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="seconds per chat completion")
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0, help="fraction of completions throttled with a 429")
+    parser.add_argument("--llm-words", type=int, default=300, help="words per completion")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=50.0,
+                        help="how fast completions are written after the first token, 0 for all at once")
+    parser.add_argument("--tts-latency", type=float, default=0.5, help="seconds per synthesis, plus --tts-seconds-per-char")
+    parser.add_argument("--tts-seconds-per-char", type=float, default=0.001)
+    parser.add_argument("--tts-failure-rate", type=float, default=0.0, help="fraction of syntheses throttled")
+    parser.add_argument("--tts-bytes-per-char", type=int, default=800, help="mp3 bytes per character of text")
+    parser.add_argument("--avatar-queue", type=float, default=1.0, help="seconds an avatar job waits before it runs")
+    parser.add_argument("--avatar-render", type=float, default=3.0, help="seconds an avatar job renders")
+    parser.add_argument("--avatar-failure-rate", type=float, default=0.0, help="fraction of avatar API calls throttled")
+    parser.add_argument("--video-mb", type=float, default=5.0, help="size of every rendered mp4")
+    parser.add_argument("--page-words", type=int, default=1500, help="words per grounding page")
+    parser.add_argument("--workdir", help="keep decks, outputs and logs here instead of a temporary directory")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("script_args", nargs="*", help="extra arguments for the script, after --")
+    return parser.parse_args()
+
+
+def run(config_path, log_path):
+    with open(log_path, "w", encoding="utf-8") as log:
+        process = subprocess.run([sys.executable, os.path.join(BENCH_DIR, "run.py"), config_path],
+                                 stdout=log, stderr=subprocess.STDOUT)
+    return process.returncode
+
+
+def main():
+    args = parse_args()
+    server = fakes.FakeAzureServer(queue=args.avatar_queue, render=args.avatar_render,
+                                   failure_rate=args.avatar_failure_rate, video_bytes=int(args.video_mb * 1024 * 1024),
+                                   page_words=args.page_words, seed=args.seed).start()
+    root = args.workdir or tempfile.mkdtemp(prefix="pptx-bench-")
+
+    print(f"{'script':<8}{'slides':>7}{'run':>5}{'wall s':>9}{'slides/s':>10}{'peak RSS MB':>13}"
+          f"{'saves':>7}{'save s':>8}{'saved MB':>10}{'output MB':>11}")
+    results = []
+    failed = False
+    try:
+        for slides in args.slides:
+            workdir = os.path.join(root, f"{args.script}-{slides}")
+            os.makedirs(workdir, exist_ok=True)
+            deck = os.path.join(workdir, "deck.pptx")
+            make_deck(deck, slides, url_ratio=args.url_ratio, duplicate_ratio=args.duplicate_ratio,
+                      docs_url=server.url, seed=args.seed)
+
+            for attempt in range(1, args.repeat + 1):
+                config = {
+                    "script": args.script,
+                    "workdir": workdir,
+                    "deck": deck,
+                    "slides": slides,
+                    "server": server.url,
+                    "result": os.path.join(workdir, f"result-{attempt}.json"),
+                    "args": ["--workers", str(args.workers)] + args.script_args,
+                    "llm": {"latency": args.llm_latency, "tokens_per_second": args.llm_tokens_per_second,
+                            "failure_rate": args.llm_failure_rate,
+                            "words": args.llm_words, "seed": args.seed},
+                    "speech": {"latency": args.tts_latency, "seconds_per_char": args.tts_seconds_per_char,
+                               "failure_rate": args.tts_failure_rate, "bytes_per_char": args.tts_bytes_per_char,
+                               "seed": args.seed},
+                }
+                config_path = os.path.join(workdir, "config.json")
+                with open(config_path, "w", encoding="utf-8") as file:
+                    json.dump(config, file, indent=2)
+
+                log_path = os.path.join(workdir, f"run-{attempt}.log")
+                if run(config_path, log_path) != 0:
+                    print(f"{args.script} on {slides} slides failed, see {log_path}")
+                    failed = True
+                    continue
+
+                with open(config["result"], encoding="utf-8") as file:
+                    result = json.load(file)
+                results.append({"script": args.script, "slides": slides, "run": attempt, **result})
+                print(f"{args.script:<8}{slides:>7}{attempt:>5}{result['wall']:>9.1f}{result['slides_per_second']:>10.2f}"
+                      f"{result['peak_rss'] / 2**20:>13.1f}{result['saves']:>7}{result['save_seconds']:>8.2f}"
+                      f"{result['save_bytes'] / 2**20:>10.1f}{result['output_bytes'] / 2**20:>11.1f}")
+    finally:
+        server.stop()
+        if args.workdir is None and not failed:
+            shutil.rmtree(root, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump({"args": vars(args), "results": results}, file, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
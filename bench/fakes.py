@@ -0,0 +1,287 @@
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Any, List, Optional
+
+import azure.cognitiveservices.speech as speechsdk
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+import speech
+
+
+# media bytes that don't compress, like real mp3/mp4 data, so the zip of a saved deck is as big as it should be
+_NOISE = random.Random(0).randbytes(1024 * 1024)
+
+
+def fake_media(key, size):
+    """size bytes of incompressible fake media, starting with a hash of key so different media differ."""
+    head = hashlib.sha256(key.encode("utf-8")).digest()
+    body = bytearray(head)
+    while len(body) < size:
+        body += _NOISE[:size - len(body)]
+    return bytes(body[:size])
+
+
+def _jitter(rng, latency):
+    """latency seconds give or take 50%, drawn from rng."""
+    return latency * rng.uniform(0.5, 1.5) if latency else 0
+
+
+class FakeRateLimitError(Exception):
+    """What the OpenAI client raises for a 429, as far as ratelimit.retry_after() is concerned."""
+
+    status_code = 429
+
+    def __init__(self, retry_after_ms):
+        super().__init__("Too Many Requests")
+        self.response = SimpleNamespace(status_code=429, headers={"retry-after-ms": str(retry_after_ms)})
+
+
+def fake_text(prompt, words):
+    """Deterministic text of about words words for prompt, so identical prompts get identical answers."""
+    seed = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8], 16)
+    sentences = []
+    count = 0
+    while count < words:
+        length = 8 + (seed + len(sentences)) % 10
+        sentences.append(f"Sentence {len(sentences) + 1} of answer {seed:08x} explains the topic in {length} simple words here.")
+        count += length
+    paragraphs = [" ".join(sentences[i:i + 4]) for i in range(0, len(sentences), 4)]
+    return "\n\n".join(paragraphs)
+
+
+class FakeChatModel(BaseChatModel):
+    """Stand-in for AzureChatOpenAI that answers after latency seconds with about words words.
+
+    With tokens_per_second the answer takes as long to write as a real model would, and
+    streams a word at a time. failure_rate of the calls are throttled with a 429 and a
+    Retry-After of retry_after_ms.
+    """
+
+    latency: float = 1.0
+    tokens_per_second: float = 0.0
+    failure_rate: float = 0.0
+    retry_after_ms: int = 100
+    words: int = 300
+    seed: int = 0
+    rng: Any = None
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.rng = random.Random(self.seed)
+
+    @property
+    def _llm_type(self):
+        return "fake-azure-openai"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _answer(self, messages):
+        """Wait for the first token and return the prompt and the answer."""
+        prompt = "\n".join(str(message.content) for message in messages)
+        time.sleep(_jitter(self.rng, self.latency))
+        if self.rng.random() < self.failure_rate:
+            raise FakeRateLimitError(self.retry_after_ms)
+        return prompt, fake_text(prompt, self.words)
+
+    def _usage(self, prompt, content):
+        return {"input_tokens": len(prompt) // 4, "output_tokens": len(content) // 4,
+                "total_tokens": (len(prompt) + len(content)) // 4}
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs):
+        prompt, content = self._answer(messages)
+        if self.tokens_per_second:
+            time.sleep(len(content) / 4 / self.tokens_per_second)
+        message = AIMessage(content=content, usage_metadata=self._usage(prompt, content))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs):
+        prompt, content = self._answer(messages)
+        for token in re.findall(r"\S+\s*|\s+", content):
+            if self.tokens_per_second:
+                time.sleep(len(token) / 4 / self.tokens_per_second)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(prompt, content)))
+
+
+class _FakeSynthesizer:
+    """Writes bytes_per_char bytes of fake mp3 per character of SSML text into the sink of its slot."""
+
+    def __init__(self, sink, options, rng):
+        self.sink = sink
+        self.options = options
+        self.rng = rng
+
+    def speak_ssml_async(self, ssml):
+        return SimpleNamespace(get=lambda: self._speak(ssml))
+
+    def _speak(self, ssml):
+        options = self.options
+        text = re.sub(r"<[^>]+>", "", ssml)
+        time.sleep(_jitter(self.rng, options.latency) + len(text) * options.seconds_per_char)
+        if self.rng.random() < options.failure_rate:
+            details = SimpleNamespace(reason=speechsdk.CancellationReason.Error,
+                                      error_code=speechsdk.CancellationErrorCode.TooManyRequests,
+                                      error_details="fake throttling")
+            return SimpleNamespace(reason=speechsdk.ResultReason.Canceled, cancellation_details=details)
+
+        # stream the audio in chunks like the service does
+        audio = b"\xff\xfb\x90\x00" + fake_media(ssml, max(len(text) * options.bytes_per_char, 32))
+        for start in range(0, len(audio), 64 * 1024):
+            self.sink.write(memoryview(audio[start:start + 64 * 1024]))
+        return SimpleNamespace(reason=speechsdk.ResultReason.SynthesizingAudioCompleted)
+
+
+def install_fake_speech(latency=0.5, seconds_per_char=0.0, failure_rate=0.0, bytes_per_char=800, seed=0):
+    """Make every SynthesizerPool hand out fake synthesizers instead of connecting to Azure Speech.
+
+    Only SynthesizerPool._create() is replaced, pooling, streaming and retries run as usual.
+    """
+    options = SimpleNamespace(latency=latency, seconds_per_char=seconds_per_char,
+                              failure_rate=failure_rate, bytes_per_char=bytes_per_char)
+    rng = random.Random(seed)
+
+    def create(pool):
+        sink = speech._StreamSink()
+        return _FakeSynthesizer(sink, options, rng), sink, None, None
+
+    speech.SynthesizerPool._create = create
+
+
+class FakeAzureServer:
+    """Local HTTP server standing in for the avatar batch synthesis API and for grounding pages.
+
+    PUT/GET /avatar/batchsyntheses/<id> behave like the real API: a job is NotStarted for
+    queue seconds, Running for render seconds and then Succeeded with a download url under
+    /files/, which serves video_bytes of fake mp4 with Range support. failure_rate of the
+    API calls are answered with 429 and a Retry-After. GET /docs/<n> serves an HTML page
+    of about page_words words with an ETag.
+    """
+
+    def __init__(self, queue=1.0, render=3.0, failure_rate=0.0, video_bytes=5 * 1024 * 1024, page_words=1500, seed=0):
+        self.queue = queue
+        self.render = render
+        self.failure_rate = failure_rate
+        self.video_bytes = video_bytes
+        self.page_words = page_words
+        self.rng = random.Random(seed)
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _throttled(self):
+        with self.lock:
+            return self.rng.random() < self.failure_rate
+
+    def _job(self, job_id):
+        with self.lock:
+            created = self.jobs.get(job_id)
+        if created is None:
+            return None
+        elapsed = time.monotonic() - created
+        job = {"id": job_id, "status": "NotStarted"}
+        if elapsed >= self.queue + self.render:
+            job["status"] = "Succeeded"
+            job["outputs"] = {"result": f"{self.url}/files/{job_id}.mp4"}
+        elif elapsed >= self.queue:
+            job["status"] = "Running"
+        return job
+
+    def _video(self, job_id):
+        """The fake mp4 of a job, unique per job and the same on every request."""
+        return fake_media(job_id, self.video_bytes)
+
+    def _page(self, name):
+        words = " ".join(f"word{i % 97}" for i in range(self.page_words))
+        paragraphs = "".join(f"<p>{words[i:i + 600]}</p>" for i in range(0, len(words), 600))
+        return f"<html><head><title>Page {name}</title></head><body><article><h1>Page {name}</h1>{paragraphs}</article></body></html>".encode("utf-8")
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, body=b"", headers=None, content_type="application/json"):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(body)
+
+            def _json(self, status, data):
+                self._send(status, json.dumps(data).encode("utf-8"))
+
+            def _job_id(self):
+                path = self.path.split("?")[0]
+                match = re.fullmatch(r"/+avatar/batchsyntheses/([^/]+)", path)
+                return match.group(1) if match else None
+
+            def do_PUT(self):
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                job_id = self._job_id()
+                if job_id is None:
+                    return self._json(404, {"error": "not found"})
+                if server._throttled():
+                    return self._send(429, b"{}", {"Retry-After": "0.1"})
+                with server.lock:
+                    server.jobs.setdefault(job_id, time.monotonic())
+                self._json(201, {"id": job_id, "status": "NotStarted"})
+
+            def do_GET(self):
+                path = self.path.split("?")[0]
+                job_id = self._job_id()
+                if job_id is not None:
+                    if server._throttled():
+                        return self._send(429, b"{}", {"Retry-After": "0.1"})
+                    job = server._job(job_id)
+                    return self._json(200, job) if job else self._json(404, {"error": "not found"})
+
+                match = re.fullmatch(r"/files/([^/]+)\.mp4", path)
+                if match:
+                    return self._file(server._video(match.group(1)))
+
+                match = re.fullmatch(r"/docs/([^/]+)", path)
+                if match:
+                    body = server._page(match.group(1))
+                    etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+                    if self.headers.get("If-None-Match") == etag:
+                        return self._send(304, headers={"ETag": etag})
+                    return self._send(200, body, {"ETag": etag}, content_type="text/html")
+
+                self._json(404, {"error": "not found"})
+
+            def _file(self, data):
+                match = re.fullmatch(r"bytes=(\d+)-", self.headers.get("Range") or "")
+                if match:
+                    start = int(match.group(1))
+                    return self._send(206, data[start:], {"Content-Range": f"bytes {start}-{len(data) - 1}/{len(data)}"},
+                                      content_type="video/mp4")
+                self._send(200, data, content_type="video/mp4")
+
+        return Handler
@@ -0,0 +1,53 @@
+"""Checks that audio.py and video.py start within an import-time budget.
+
+Every script is imported in a fresh interpreter a few times, the best time counts. The
+LLM backends must not be imported up front either, they load on the first cache miss:
+
+    python bench/importtime.py --budget 0.5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ["audio", "video"]
+# only needed once a prompt misses the cache or a slide links a page
+LAZY_MODULES = ["langchain", "langchain_core", "langchain_openai", "openai", "readability", "markdownify"]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+print(json.dumps({{"seconds": time.perf_counter() - start, "modules": sorted(sys.modules)}}))
+"""
+
+
+def import_time(module):
+    output = subprocess.run([sys.executable, "-c", PROBE.format(module=module)], cwd=ROOT,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget", type=float, default=0.5, help="seconds each script may take to import (default: 0.5)")
+    parser.add_argument("--runs", type=int, default=5, help="imports per script, the fastest counts")
+    args = parser.parse_args()
+
+    failed = False
+    for module in MODULES:
+        probes = [import_time(module) for _ in range(args.runs)]
+        seconds = min(probe["seconds"] for probe in probes)
+        eager = [name for name in LAZY_MODULES if name in probes[0]["modules"]]
+        ok = seconds <= args.budget and not eager
+        failed = failed or not ok
+        print(f"{module + '.py':<10}{seconds:>8.3f}s  (budget {args.budget:.3f}s)  {'ok' if ok else 'OVER BUDGET'}")
+        if eager:
+            print(f"  imported up front: {', '.join(eager)}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""Runs audio.py or video.py once against the fakes, in its own process so peak RSS is its own.
+
+Started by bench.py with the path of a config file written into the working directory of the run.
+"""
+import json
+import os
+import resource
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def main():
+    with open(sys.argv[1], encoding="utf-8") as file:
+        config = json.load(file)
+    os.chdir(config["workdir"])
+
+    # fake credentials, and no rate limits from a .env file: the fakes do the throttling
+    os.environ.update(AZURE_OPENAI_ENDPOINT=config["server"], AZURE_OPENAI_DEPLOYMENT_NAME="bench",
+                      AZURE_OPENAI_API_VERSION="bench", AZURE_OPENAI_API_KEY="bench", SPEECH_API_KEY="bench",
+                      SPEECH_ENDPOINT=config["server"], CACHE_DIR=".cache",
+                      OPENAI_RPM="", OPENAI_TPM="", SPEECH_RPM="", AVATAR_RPM="")
+
+    import core
+    import fakes
+    from pipeline import find_decks
+    from telemetry import telemetry
+
+    llm = config["llm"]
+    fakes.install_fake_speech(**config["speech"])
+    core.make_llm = lambda: fakes.FakeChatModel(**llm)
+    if config["script"] == "audio":
+        import audio as script
+    else:
+        import video as script
+
+    sys.argv = [f"{config['script']}.py", config["deck"], "--spans", "spans.jsonl"] + config["args"]
+    start = time.monotonic()
+    script.main()
+    wall = time.monotonic() - start
+
+    saves = [span for span in telemetry.spans if span["stage"] == "save"]
+    stages = {}
+    for span in telemetry.spans:
+        stage = stages.setdefault(span["stage"], {"count": 0, "seconds": 0.0, "bytes": 0, "retries": 0})
+        stage["count"] += 1
+        stage["seconds"] += span["wall"]
+        stage["bytes"] += span.get("bytes") or 0
+        stage["retries"] += span.get("retries") or 0
+
+    [(_, pptx_output)] = find_decks([config["deck"]], f"-{config['script']}")
+    result = {
+        "wall": wall,
+        "slides_per_second": config["slides"] / wall,
+        "peak_rss": peak_rss(),
+        "saves": len(saves),
+        "save_seconds": sum(span["wall"] for span in saves),
+        "save_bytes": sum(span.get("bytes") or 0 for span in saves),
+        "output_bytes": os.path.getsize(pptx_output),
+        "stages": stages,
+    }
+    with open(config["result"], "w", encoding="utf-8") as file:
+        json.dump(result, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
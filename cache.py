@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from collections import Counter
+
+DEFAULT_CACHE_DIR = ".cache"
+DEFAULT_CACHE_MAX_MB = 2048
+# subdirectory of the cache the grounding fetcher keeps its HTTP responses in, outside the LRU
+HTTP_CACHE_DIR = "http"
+
+
+def cache_key(*parts):
+    """Hash everything an output depends on (text, templates, model and voice config) into a key."""
+    data = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+class Cache:
+    """Content-addressed on-disk cache for transcripts, SSML and synthesized media.
+
+    Entries are files named after their key. A hit touches the file, so the modification
+    time doubles as the LRU order, and the least recently used entries are evicted once
+    the cache grows beyond max_bytes. A cache without a directory never hits.
+
+    Entries handed out with pin=True (or pinned with pin()) are not evicted until they
+    are released, so media a worker returned survives until the deck embedded it.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_MAX_MB * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.pinned = Counter()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.size = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self.size = sum(os.path.getsize(path) for path in self._entries())
+
+    def _entries(self):
+        for root, dirs, files in os.walk(self.directory):
+            if root == self.directory and HTTP_CACHE_DIR in dirs:
+                dirs.remove(HTTP_CACHE_DIR)
+            for name in files:
+                if not name.endswith(".part"):
+                    yield os.path.join(root, name)
+
+    def _path(self, key, suffix):
+        return os.path.join(self.directory, key[:2], key + suffix)
+
+    def get_file(self, key, suffix, pin=False):
+        """Return the path of the cached entry, or None on a miss."""
+        if self.directory is None:
+            return None
+
+        path = self._path(key, suffix)
+        with self.lock:
+            if os.path.exists(path):
+                os.utime(path)
+                self.hits += 1
+                if pin:
+                    self.pinned[os.path.abspath(path)] += 1
+                return path
+            self.misses += 1
+            return None
+
+    def put_file(self, key, suffix, source, pin=False):
+        """Move the file at source into the cache and return its new path."""
+        if self.directory is None:
+            return source
+
+        path = self._path(key, suffix)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4()}.part"
+        shutil.move(source, tmp_path)
+        os.replace(tmp_path, path)
+
+        with self.lock:
+            if pin:
+                self.pinned[os.path.abspath(path)] += 1
+            self.size += os.path.getsize(path)
+            if self.size > self.max_bytes:
+                self._evict(keep=path)
+        return path
+
+    def file(self, key, suffix, produce, pin=False):
+        """Return the cached file for key, calling produce() for a local file path on a miss."""
+        path = self.get_file(key, suffix, pin=pin)
+        if path is not None:
+            return path
+
+        source = produce()
+        if source is None:
+            return None
+        return self.put_file(key, suffix, source, pin=pin)
+
+    def pin(self, path):
+        """Keep the file at path from being evicted until release(path), return False if it is gone already."""
+        with self.lock:
+            if not os.path.exists(path):
+                return False
+            self.pinned[os.path.abspath(path)] += 1
+            return True
+
+    def release(self, path):
+        path = os.path.abspath(path)
+        with self.lock:
+            self.pinned[path] -= 1
+            if self.pinned[path] <= 0:
+                del self.pinned[path]
+
+    def text(self, key, produce):
+        """Return the cached text for key, calling produce() for it on a miss."""
+        path = self.get_file(key, ".txt")
+        if path is not None:
+            try:
+                with open(path, encoding="utf-8") as file:
+                    return file.read()
+            except FileNotFoundError:
+                # evicted by another thread since the lookup
+                pass
+
+        value = produce()
+        if self.directory is not None:
+            tmp_path = os.path.join(self.directory, f"{uuid.uuid4()}.part")
+            with open(tmp_path, "w", encoding="utf-8") as file:
+                file.write(value)
+            self.put_file(key, ".txt", tmp_path)
+        return value
+
+    def _evict(self, keep):
+        entries = sorted(self._entries(), key=os.path.getmtime)
+        self.size = sum(os.path.getsize(path) for path in entries)
+        for path in entries:
+            if self.size <= self.max_bytes:
+                break
+            if path == keep or os.path.abspath(path) in self.pinned:
+                continue
+            self.size -= os.path.getsize(path)
+            os.remove(path)
+            self.evictions += 1
+
+    def summary(self):
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0
+        return (f"Cache: {self.hits} hits, {self.misses} misses ({rate:.0%} hit rate), "
+                f"{self.evictions} evicted, {self.size:,} bytes in {self.directory}")
@@ -0,0 +1,176 @@
+"""Code shared by audio.py and video.py: the command line and the LLM chains that write a slide.
+
+Backends are imported on first use: langchain and Azure OpenAI only load once a prompt
+misses the cache, so a run that finds everything in the cache or journal never pays for them.
+"""
+import argparse
+import os
+import re
+import threading
+
+from cache import DEFAULT_CACHE_DIR, DEFAULT_CACHE_MAX_MB, cache_key
+from fetch import fetch_urls, retrieve_markdown
+from pipeline import DEFAULT_WORKERS
+from ratelimit import call_with_retry, get_rate_limits
+from telemetry import DEFAULT_SPANS_FILE, telemetry
+
+DEFAULT_DECK = "pptx/MS-4005-ENU-PowerPoint_01.pptx"
+URL_PATTERN = r"https?://[^\s]+"
+
+
+def retrieve_html(url, cache_dir=None):
+    """Retrieve a website by it's HTTP url and return the HTML content."""
+    import requests
+
+    try:
+        return retrieve_markdown(url, cache_dir)
+    except requests.RequestException as e:
+        # ground the slide on its notes alone rather than failing the run over one link
+        print(f"- Skipping {url}, it could not be retrieved: {e}")
+        return ""
+
+
+def retrieve_html_tool(cache_dir=None):
+    from langchain_core.tools import Tool
+
+    return Tool(name="retrieve_html", func=lambda url: retrieve_html(url, cache_dir),
+                description="Fetches content from a provided URL")
+
+
+def make_llm():
+    """Create the Azure OpenAI chat model from the AZURE_OPENAI_* environment variables."""
+    from langchain.globals import set_debug, set_verbose
+    from langchain_openai import AzureChatOpenAI
+
+    set_verbose(True)
+    set_debug(False)
+    return AzureChatOpenAI(
+        azure_endpoint=os.environ["AZURE_OPENAI_ENDPOINT"],
+        azure_deployment=os.environ["AZURE_OPENAI_DEPLOYMENT_NAME"],
+        openai_api_version=os.environ["AZURE_OPENAI_API_VERSION"],
+        stream_usage=True,
+    )
+
+
+def argument_parser(description, suffix, services):
+    """The arguments audio.py and video.py have in common, suffix names the output decks."""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("decks", nargs="*", default=[DEFAULT_DECK],
+                        help="input decks, or directories to take every deck from (default: %(default)s)")
+    parser.add_argument("--output-dir", default=None,
+                        help=f"directory for the output decks (default: next to each input deck, as name{suffix}.pptx)")
+    parser.add_argument("--workers", type=int, default=os.getenv("MAX_WORKERS", DEFAULT_WORKERS),
+                        help="number of slides processed concurrently, across all decks (default: $MAX_WORKERS or 4)")
+    parser.add_argument("--save-every", type=int, default=None, metavar="N",
+                        help="also save the output deck after every N slides")
+    parser.add_argument("--save-interval", type=float, default=None, metavar="SECONDS",
+                        help="also save the output deck when SECONDS have passed since the last save")
+    parser.add_argument("--low-memory", action="store_true",
+                        help="keep generated media on disk and stream it into the output deck when saving, instead of holding it in memory")
+    parser.add_argument("--llm-url-tool", action="store_true",
+                        help="let the LLM pick the url to ground a slide on through the retrieve_html tool, instead of fetching every url in the notes")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only rebuild slides whose notes changed since the last run, reuse the media of the others")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue an interrupted run, skipping every stage recorded in its journal")
+    parser.add_argument("--cache-dir", default=os.getenv("CACHE_DIR", DEFAULT_CACHE_DIR),
+                        help="directory of the LLM/media cache (default: $CACHE_DIR or .cache)")
+    parser.add_argument("--cache-max-mb", type=int, default=os.getenv("CACHE_MAX_MB", DEFAULT_CACHE_MAX_MB),
+                        help="evict the least recently used cache entries beyond this size (default: $CACHE_MAX_MB or 2048)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help=f"always call Azure OpenAI and {services}, don't read or write the cache")
+    parser.add_argument("--spans", default=os.getenv("SPANS_FILE", DEFAULT_SPANS_FILE),
+                        help="write one JSON line per stage span to this file (default: $SPANS_FILE or telemetry.jsonl)")
+    return parser
+
+
+class SlideWriter:
+    """Writes the transcript and the notes (questions) of a slide with Azure OpenAI.
+
+    templates maps a stage to its prompt, with a {content} placeholder: "instructions" for
+    slides without urls, "teach" and "questions" for slides grounded on the urls in their
+    notes, and whatever else the script invokes itself. Completions go through the cache,
+    the slide journal and the shared rate limits. The model is created on the first miss.
+    With on_delta the transcript is streamed: on_delta gets every piece of text as the
+    model writes it, unless the transcript comes from the cache or journal.
+    """
+
+    def __init__(self, templates, cache, llm_url_tool=False):
+        self.templates = templates
+        self.cache = cache
+        self.llm_url_tool = llm_url_tool
+        self.deployment = os.environ["AZURE_OPENAI_DEPLOYMENT_NAME"]
+        self.limits = get_rate_limits()
+        self.lock = threading.Lock()
+        self._llm = None
+        self._prompts = {}
+
+    @property
+    def llm(self):
+        with self.lock:
+            if self._llm is None:
+                self._llm = make_llm()
+            return self._llm
+
+    def prompt(self, stage):
+        from langchain_core.prompts import PromptTemplate
+
+        with self.lock:
+            if stage not in self._prompts:
+                self._prompts[stage] = PromptTemplate(input_variables=["content"], template=self.templates[stage])
+            return self._prompts[stage]
+
+    def invoke_llm(self, stage, chain, input, prompt, on_delta=None):
+        """Invoke chain, with on_delta stream it and pass the text of every chunk to on_delta as it arrives."""
+        def stream():
+            response = None
+            for chunk in chain.stream(input):
+                on_delta(chunk.content)
+                response = chunk if response is None else response + chunk
+            return response
+
+        # a throttled request fails before its first chunk, so a retry never repeats streamed text
+        call = stream if on_delta is not None else lambda: chain.invoke(input)
+        with telemetry.span(f"llm:{stage}") as span:
+            response = call_with_retry(call, self.limits.llm(prompt))
+            usage = getattr(response, "usage_metadata", None) or {}
+            span["prompt_tokens"] = usage.get("input_tokens")
+            span["completion_tokens"] = usage.get("output_tokens")
+            return response
+
+    def invoke_cached(self, stage, content, on_delta=None):
+        """Return the completion of the stage prompt for content, from the cache if it was asked before."""
+        key = cache_key("llm", self.deployment, self.templates[stage], content)
+
+        def invoke():
+            prompt = self.prompt(stage)
+            return self.invoke_llm(stage, prompt | self.llm, {"content": content}, prompt.format(content=content), on_delta).content
+
+        return self.cache.text(key, invoke)
+
+    def write(self, i, notes, log, on_delta=None):
+        """Return the transcript and the notes text of slide i, grounded on the urls in its notes."""
+        urls = re.findall(URL_PATTERN, notes)
+        if not urls:
+            print(f"slide {i}: chain: instructions")
+            return log.text("transcript", lambda: self.invoke_cached("instructions", notes, on_delta)), ""
+
+        if self.llm_url_tool:
+            print(f"slide {i}: chain: content (url)")
+            tool = retrieve_html_tool(self.cache.directory)
+            content_chain = self.llm.bind_tools([tool]) | (lambda x: x.tool_calls[0]["args"]) | tool
+            content = log.text("content", lambda: self.invoke_llm("content", content_chain, notes, notes))
+        else:
+            print(f"slide {i}: fetching {len(urls)} url(s)")
+            content = log.text("content", lambda: "\n\n".join(fetch_urls(urls, self.cache.directory)))
+
+        from langchain_core.runnables import RunnableLambda, RunnableParallel
+
+        # teaching and questioning only depend on the notes and the fetched content, run them side by side
+        print(f"slide {i}: chain: teaching + questioning")
+        fan_out = RunnableParallel(
+            transcript=RunnableLambda(lambda content: log.text("transcript", lambda: self.invoke_cached("teach", content, on_delta))),
+            questions=RunnableLambda(lambda content: log.text("questions", lambda: self.invoke_cached("questions", content))),
+        )
+        responses = fan_out.invoke(notes + "\n\n" + content)
+        return responses["transcript"], responses["questions"]
@@ -0,0 +1,136 @@
+import hashlib
+import os
+import shutil
+import zipfile
+
+from pptx.package import _MediaParts
+from pptx.parts.media import MediaPart
+
+HASH_CHUNK_SIZE = 1024 * 1024
+COPY_CHUNK_SIZE = 1024 * 1024
+PLACEHOLDER_PREFIX = b"pptx_audio placeholder for media "
+
+
+def file_sha1(path):
+    """Return the SHA1 of the file at path, hashed in chunks."""
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+class _IndexedMediaParts(_MediaParts):
+    """The media parts of a package, looked up by SHA1 through an index.
+
+    python-pptx finds an existing part for new media by walking every relationship in
+    the package and re-hashing the blob of every media part, for every add_movie().
+    The index hashes each part once.
+    """
+
+    def __init__(self, package):
+        super().__init__(package)
+        self.index = None
+
+    def _ensure_index(self):
+        if self.index is None:
+            self.index = {part.sha1: part for part in self}
+
+    def contains(self, sha1):
+        self._ensure_index()
+        return sha1 in self.index
+
+    def get_or_add_media_part(self, media):
+        self._ensure_index()
+        media_part = self.index.get(media.sha1)
+        if media_part is None:
+            media_part = MediaPart.new(self._package, media)
+            self.index[media.sha1] = media_part
+        return media_part
+
+
+class MediaEmbedder:
+    """Adds media to the slides of one presentation, storing identical media only once.
+
+    Media is identified by the SHA1 of its bytes. A slide whose media is identical to
+    media already in the deck gets a reference to the existing package part, and the
+    bytes that were not stored again are counted.
+
+    With a spool_dir the media never enters memory: the deck gets a small placeholder
+    part per distinct media file, the file itself is linked (or copied) into spool_dir,
+    and write_package() streams it into the saved deck in place of its placeholder.
+    """
+
+    def __init__(self, presentation, spool_dir=None):
+        package = presentation.part.package
+        self.media_parts = _IndexedMediaParts(package)
+        # python-pptx caches _media_parts in the instance dict, replace it with the indexed lookup
+        package.__dict__["_media_parts"] = self.media_parts
+        self.spool_dir = spool_dir
+        self.spooled = {}
+        if spool_dir is not None:
+            os.makedirs(os.path.join(spool_dir, "placeholders"), exist_ok=True)
+        self.embedded = 0
+        self.duplicates = 0
+        self.saved_bytes = 0
+
+    def add_movie(self, slide, movie_file, left, top, width, height, **kwargs):
+        sha1 = file_sha1(movie_file)
+        media_file = movie_file if self.spool_dir is None else self._placeholder(movie_file, sha1)
+        key = sha1 if self.spool_dir is None else file_sha1(media_file)
+
+        duplicate = self.media_parts.contains(key)
+        if duplicate:
+            self.duplicates += 1
+            self.saved_bytes += os.path.getsize(movie_file)
+
+        self.embedded += 1
+        movie = slide.shapes.add_movie(media_file, left, top, width, height, **kwargs)
+        if self.spool_dir is not None and not duplicate:
+            part = self.media_parts.index[key]
+            self.spooled[part.partname.lstrip("/")] = self._spool(movie_file, sha1)
+        return movie
+
+    def _placeholder(self, movie_file, sha1):
+        # named like the media, python-pptx takes the extension of the part from the file name
+        path = os.path.join(self.spool_dir, "placeholders", sha1 + os.path.splitext(movie_file)[1])
+        if not os.path.exists(path):
+            with open(path, "wb") as file:
+                file.write(PLACEHOLDER_PREFIX + sha1.encode("ascii"))
+        return path
+
+    def _spool(self, movie_file, sha1):
+        # the cache may evict movie_file before the deck is saved, keep a link of our own
+        path = os.path.join(self.spool_dir, sha1 + os.path.splitext(movie_file)[1])
+        if not os.path.exists(path):
+            try:
+                os.link(movie_file, path)
+            except OSError:
+                shutil.copyfile(movie_file, path)
+        return path
+
+    def write_package(self, saved, pptx_output):
+        """Copy the deck python-pptx saved with placeholders to pptx_output, streaming the spooled media in."""
+        with zipfile.ZipFile(saved) as source, zipfile.ZipFile(pptx_output, "w", zipfile.ZIP_DEFLATED) as target:
+            for info in source.infolist():
+                member = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+                media = self.spooled.get(info.filename)
+                if media is None:
+                    member.compress_type = zipfile.ZIP_DEFLATED
+                    with source.open(info) as reader, target.open(member, "w") as writer:
+                        shutil.copyfileobj(reader, writer, COPY_CHUNK_SIZE)
+                else:
+                    # audio and video are compressed already
+                    member.compress_type = zipfile.ZIP_STORED
+                    member.file_size = os.path.getsize(media)
+                    with open(media, "rb") as reader, target.open(member, "w") as writer:
+                        shutil.copyfileobj(reader, writer, COPY_CHUNK_SIZE)
+
+    def close(self):
+        """Remove the spool directory, once the deck is saved for the last time."""
+        if self.spool_dir is not None:
+            shutil.rmtree(self.spool_dir, ignore_errors=True)
+
+    def summary(self):
+        return (f"Embedded {self.embedded} media file(s), {self.duplicates} duplicate(s) reused an existing part, "
+                f"{self.saved_bytes:,} bytes deduplicated")
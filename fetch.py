@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from cache import HTTP_CACHE_DIR
+from telemetry import in_context, telemetry
+
+MAX_FETCH_WORKERS = 8
+MAX_PER_HOST = 4
+FETCH_TIMEOUT = 30
+FETCH_RETRIES = 3
+
+
+class Fetcher:
+    """Shared HTTP fetcher for grounding urls.
+
+    All requests go through one session with keep-alive connection pooling and retries,
+    at most per_host requests run against the same host at once, and responses are kept
+    in an on-disk cache that is revalidated with ETag/Last-Modified conditional requests.
+    That cache lives in the http directory of cache_dir, without cache_dir there is none.
+    Within a run every url is fetched and converted to markdown only once.
+    """
+
+    def __init__(self, cache_dir=None, per_host=MAX_PER_HOST, timeout=FETCH_TIMEOUT, retries=FETCH_RETRIES):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        self.cache_dir = None if cache_dir is None else os.path.join(cache_dir, HTTP_CACHE_DIR)
+        if self.cache_dir is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+        self.per_host = per_host
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = os.getenv("USER_AGENT", "pptx_audio")
+        retry = Retry(total=retries, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=("GET",), respect_retry_after_header=True)
+        adapter = HTTPAdapter(pool_connections=MAX_FETCH_WORKERS, pool_maxsize=MAX_FETCH_WORKERS, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.lock = threading.Lock()
+        self.hosts = {}
+        self.url_locks = {}
+        self.bodies = {}
+        self.markdowns = {}
+
+    def _host_limit(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            if host not in self.hosts:
+                self.hosts[host] = threading.BoundedSemaphore(self.per_host)
+            return self.hosts[host]
+
+    def _url_lock(self, url):
+        with self.lock:
+            return self.url_locks.setdefault(url, threading.Lock())
+
+    def _cache_paths(self, url):
+        if self.cache_dir is None:
+            return None, None
+        name = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, name + ".json"), os.path.join(self.cache_dir, name + ".body")
+
+    def get(self, url):
+        """Return the body of url, from this run, the revalidated disk cache or the network."""
+        with self._url_lock(url):
+            if url in self.bodies:
+                return self.bodies[url]
+
+            meta_path, body_path = self._cache_paths(url)
+            meta = {}
+            headers = {}
+            if meta_path is not None and os.path.exists(meta_path) and os.path.exists(body_path):
+                with open(meta_path, encoding="utf-8") as file:
+                    meta = json.load(file)
+                if meta.get("etag"):
+                    headers["If-None-Match"] = meta["etag"]
+                if meta.get("last_modified"):
+                    headers["If-Modified-Since"] = meta["last_modified"]
+
+            print(f"Retrieving HTML from {url}")
+            with telemetry.span("fetch", url=url) as span:
+                with self._host_limit(url):
+                    response = self.session.get(url, headers=headers, timeout=self.timeout)
+                span["bytes"] = len(response.content)
+
+                body = None
+                if response.status_code == 304:
+                    try:
+                        with open(body_path, "rb") as file:
+                            body = file.read()
+                        print(f"- {url} not modified, using the cached copy")
+                        span["not_modified"] = True
+                    except FileNotFoundError:
+                        # the cached copy went away since the request was made, ask for the page itself
+                        with self._host_limit(url):
+                            response = self.session.get(url, timeout=self.timeout)
+                        span["bytes"] = len(response.content)
+                if body is None:
+                    response.raise_for_status()
+                    body = response.content
+                    self._store(meta_path, body_path, response, body)
+
+            self.bodies[url] = body
+            return body
+
+    def _store(self, meta_path, body_path, response, body):
+        if meta_path is None:
+            return
+        if not response.headers.get("ETag") and not response.headers.get("Last-Modified"):
+            return
+
+        tmp_suffix = f".{uuid.uuid4()}.part"
+        with open(body_path + tmp_suffix, "wb") as file:
+            file.write(body)
+        os.replace(body_path + tmp_suffix, body_path)
+        with open(meta_path + tmp_suffix, "w", encoding="utf-8") as file:
+            json.dump({"etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified")}, file)
+        os.replace(meta_path + tmp_suffix, meta_path)
+
+    def markdown(self, url):
+        """Return the readable part of url as markdown, converted once per url and content hash."""
+        body = self.get(url)
+        key = (url, hashlib.sha256(body).hexdigest())
+        with self._url_lock(url):
+            if key not in self.markdowns:
+                self.markdowns[key] = html_to_markdown(body)
+            return self.markdowns[key]
+
+
+def html_to_markdown(html):
+    import markdownify
+    from readability import Document
+
+    doc = Document(html)
+
+    markdown = markdownify.markdownify(str(doc.summary()), heading_style="ATX")
+    markdown = re.sub('\n{3,}', '\n\n', markdown)
+    markdown = markdown.replace("[Continue](/en-us/)", "")
+
+    return markdown
+
+
+_fetcher = None
+_fetcher_lock = threading.Lock()
+
+
+def get_fetcher(cache_dir=None):
+    """Return the fetcher shared by the whole process, created on first use with the responses cached in cache_dir."""
+    global _fetcher
+    with _fetcher_lock:
+        if _fetcher is None:
+            _fetcher = Fetcher(cache_dir)
+        return _fetcher
+
+
+def retrieve_markdown(url, cache_dir=None):
+    """Retrieve a website by it's HTTP url and return the readable part as markdown."""
+    return get_fetcher(cache_dir).markdown(url)
+
+
+def fetch_urls(urls, cache_dir=None):
+    """Retrieve every url concurrently and return their markdown in the order the urls were given.
+
+    A url that can't be retrieved is skipped, the slide is grounded on the others (or on its notes alone).
+    """
+    import requests
+
+    def retrieve(url):
+        try:
+            return retrieve_markdown(url, cache_dir)
+        except requests.RequestException as e:
+            print(f"- Skipping {url}, it could not be retrieved: {e}")
+            return None
+
+    # drop duplicates and punctuation the url pattern picks up at the end of a sentence
+    urls = list(dict.fromkeys(url.rstrip(".,;:") for url in urls))
+    with ThreadPoolExecutor(max_workers=min(len(urls), MAX_FETCH_WORKERS) or 1) as executor:
+        return [markdown for markdown in executor.map(in_context(retrieve), urls) if markdown is not None]
@@ -0,0 +1,96 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+def notes_hash(notes):
+    return hashlib.sha256(notes.encode("utf-8")).hexdigest()
+
+
+class Journal:
+    """Append-only JSON lines log of the stages every slide went through.
+
+    Each line records one finished stage of one slide (fetched content, transcript, SSML,
+    submitted avatar job, downloaded media, embedded), together with the hash of the notes
+    it was produced for. A resumed run replays the log and skips every stage that
+    finished before, as long as the notes of the slide did not change.
+    """
+
+    def __init__(self, pptx_output, resume=False):
+        self.path = pptx_output + ".journal.jsonl"
+        self.lock = threading.Lock()
+        self.entries = {}
+        if resume and os.path.exists(self.path):
+            self._replay()
+            print(f"Resuming from {self.path} ({len(self.entries)} slide(s) journaled)")
+        self.file = open(self.path, "a" if resume else "w", encoding="utf-8")
+
+    def _replay(self):
+        with open(self.path, encoding="utf-8") as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # the last line is incomplete when the process died while writing it
+                    continue
+                key = (entry["slide"], entry["notes_sha256"])
+                self.entries.setdefault(key, {})[entry["stage"]] = entry
+
+    def slide(self, slide_id, notes):
+        return SlideJournal(self, str(slide_id), notes_hash(notes))
+
+    def get(self, slide_id, notes_sha256, stage):
+        with self.lock:
+            return self.entries.get((slide_id, notes_sha256), {}).get(stage)
+
+    def record(self, slide_id, notes_sha256, stage, **data):
+        entry = {"slide": slide_id, "notes_sha256": notes_sha256, "stage": stage, "time": time.time(), **data}
+        with self.lock:
+            self.entries.setdefault((slide_id, notes_sha256), {})[stage] = entry
+            self.file.write(json.dumps(entry) + "\n")
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+class SlideJournal:
+    """The journal entries of one slide."""
+
+    def __init__(self, journal, slide_id, notes_sha256):
+        self.journal = journal
+        self.slide_id = slide_id
+        self.notes_sha256 = notes_sha256
+
+    def get(self, stage):
+        return self.journal.get(self.slide_id, self.notes_sha256, stage)
+
+    def record(self, stage, **data):
+        self.journal.record(self.slide_id, self.notes_sha256, stage, **data)
+
+    def text(self, stage, produce):
+        """Return the text journaled for stage, or call produce() and journal its result."""
+        entry = self.get(stage)
+        if entry is not None:
+            return entry["value"]
+
+        value = produce()
+        self.record(stage, value=value)
+        return value
+
+    def file(self, stage, produce, keep=os.path.exists):
+        """Return the file journaled for stage if it still exists, or call produce() and journal its path.
+
+        keep(path) decides whether a journaled file can be used, Cache.pin also protects it from eviction.
+        """
+        entry = self.get(stage)
+        if entry is not None and keep(entry["path"]):
+            return entry["path"]
+
+        path = produce()
+        if path is not None:
+            self.record(stage, path=os.path.abspath(path))
+        return path
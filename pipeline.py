@@ -0,0 +1,291 @@
+import gc
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from pptx import Presentation
+
+from embedding import MediaEmbedder
+from journal import Journal, notes_hash
+from telemetry import telemetry
+
+DEFAULT_WORKERS = 4
+
+
+def iter_notes_slides(presentation):
+    """Yield (index, slide, notes) for every slide that has speaker notes."""
+    for i, slide in enumerate(presentation.slides, start=1):
+        if not slide.has_notes_slide:
+            print(f"Skipping slide {i}")
+            continue
+
+        notes = slide.notes_slide.notes_text_frame.text
+        if notes == "":
+            print(f"Skipping slide {i}")
+            continue
+
+        yield i, slide, notes
+
+
+def save_presentation(presentation, pptx_output, embedder=None):
+    """Save the deck next to pptx_output first and then move it in place, return the bytes written.
+
+    Media the embedder spooled to disk is streamed into the deck in place of its placeholders.
+    """
+    tmp_output = pptx_output + ".tmp"
+    if embedder is not None and embedder.spooled:
+        placeholders = pptx_output + ".placeholders.tmp"
+        presentation.save(placeholders)
+        try:
+            embedder.write_package(placeholders, tmp_output)
+        finally:
+            os.remove(placeholders)
+    else:
+        presentation.save(tmp_output)
+    os.replace(tmp_output, pptx_output)
+
+    size = os.path.getsize(pptx_output)
+    print(f"Saved {pptx_output} ({size:,} bytes)")
+    return size
+
+
+class Manifest:
+    """Per-slide record of a run (slide ID, notes hash, media file and notes text), stored next to the output deck.
+
+    The manifest of the previous run is loaded on creation, so an incremental run can
+    carry over the media of every slide whose notes did not change. Until the run is
+    final, saves keep the entries of the previous run for the slides not recorded yet,
+    so an interrupted run does not lose them.
+    """
+
+    def __init__(self, pptx_output):
+        self.path = pptx_output + ".manifest.json"
+        self.previous = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as file:
+                self.previous = json.load(file)["slides"]
+        self.slides = {}
+
+    def reusable(self, slide_id, notes, keep=os.path.exists):
+        """Return the (media, notes_text) of the previous run if the notes of the slide did not change."""
+        entry = self.previous.get(str(slide_id))
+        if entry is None or entry["notes_sha256"] != notes_hash(notes):
+            return None
+        if not keep(entry["media"]):
+            return None
+        return entry["media"], entry["notes_text"]
+
+    def record(self, slide_id, notes, media, notes_text):
+        self.slides[str(slide_id)] = {
+            "notes_sha256": notes_hash(notes),
+            "media": os.path.abspath(media),
+            "notes_text": notes_text,
+        }
+
+    def save(self, final=True):
+        slides = self.slides if final else {**self.previous, **self.slides}
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump({"slides": slides}, file, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+class Checkpointer:
+    """Saves the output deck once at the end, and optionally every N slides or T seconds."""
+
+    def __init__(self, presentation, pptx_output, every=None, interval=None, manifest=None, embedder=None):
+        self.presentation = presentation
+        self.pptx_output = pptx_output
+        self.manifest = manifest
+        self.embedder = embedder
+        self.every = every
+        self.interval = interval
+        self.pending = 0
+        self.last_save = time.monotonic()
+        self.saves = 0
+        self.bytes_written = 0
+
+    def slide_done(self):
+        self.pending += 1
+        if self.every and self.pending >= self.every:
+            self.save()
+        elif self.interval and time.monotonic() - self.last_save >= self.interval:
+            self.save()
+
+    def save(self, final=False):
+        with telemetry.span("save", deck=os.path.basename(self.pptx_output)) as span:
+            span["bytes"] = save_presentation(self.presentation, self.pptx_output, self.embedder)
+        self.bytes_written += span["bytes"]
+        if self.manifest is not None:
+            self.manifest.save(final)
+        self.saves += 1
+        self.pending = 0
+        self.last_save = time.monotonic()
+
+    def finish(self):
+        # a checkpoint right after the last slide already wrote everything
+        if self.pending or not self.saves:
+            self.save(final=True)
+        elif self.manifest is not None:
+            # the deck is up to date, the manifest still lists the previous run's slides
+            self.manifest.save()
+        print(f"Wrote {self.bytes_written:,} bytes in {self.saves} save(s)")
+
+
+def find_decks(paths, suffix, output_dir=None):
+    """Expand deck files and directories into (pptx_input, pptx_output) pairs.
+
+    The output of name.pptx is name<suffix>.pptx, next to the input or in output_dir.
+    Directories are searched for .pptx files, skipping earlier outputs and Office lock files.
+    """
+    decks = []
+    for path in paths:
+        if os.path.isdir(path):
+            inputs = sorted(os.path.join(path, name) for name in os.listdir(path)
+                            if name.endswith(".pptx") and not name.startswith("~$")
+                            and not name.endswith(f"{suffix}.pptx"))
+        else:
+            inputs = [path]
+
+        for pptx_input in inputs:
+            name = os.path.splitext(os.path.basename(pptx_input))[0]
+            pptx_output = os.path.join(output_dir or os.path.dirname(pptx_input), f"{name}{suffix}.pptx")
+            decks.append((pptx_input, pptx_output))
+    return decks
+
+
+class Deck:
+    """One deck of a run, with its own manifest, journal and checkpoints.
+
+    submit() queues process(i, notes, log, deck) for its slides on an executor shared by all
+    decks, embed() then waits for the results and calls embed(slide, media, notes_text,
+    embedder) in slide order, where embedder adds the media without storing duplicates.
+    process() returns (media, notes_text), where media is a file path or a Future of one.
+    log is the journal of the slide: process() records the stages it finishes there and
+    skips those that were journaled by an interrupted run. deck is this Deck, for the
+    slide_width and slide_height of the presentation.
+
+    The deck is only held in memory while its slides are read by submit() and while
+    embed() builds the output, so a run over many decks holds one at a time.
+
+    With incremental set, slides whose notes are unchanged since the run recorded in the
+    manifest are not processed again, their previous media is embedded as is.
+
+    With a cache, media process() returns must be pinned in it (Cache.pin or pin=True),
+    it is released once the last slide using it is embedded.
+
+    With low_memory set, media stays on disk (spooled next to the output deck) until it is
+    streamed into the saved deck, so memory use does not grow with the media of the deck.
+    """
+
+    def __init__(self, pptx_input, pptx_output, save_every=None, save_interval=None, resume=False, low_memory=False,
+                 cache=None):
+        self.pptx_input = pptx_input
+        self.pptx_output = pptx_output
+        self.save_every = save_every
+        self.save_interval = save_interval
+        self.resume = resume
+        self.low_memory = low_memory
+        self.cache = cache
+        self.manifest = Manifest(pptx_output)
+        self.journal = None
+        self.slide_width = None
+        self.slide_height = None
+        self.users = Counter()
+        self.jobs = []
+
+    def submit(self, process, executor, incremental=False, inflight=None, users=None):
+        """Queue the slides of the deck.
+
+        inflight maps notes hashes to the futures already queued, shared between decks, so
+        slides with identical notes are generated once and end up with identical media.
+        users counts the slides still to embed the result of every future.
+        """
+        if inflight is None:
+            inflight = {}
+        if users is not None:
+            self.users = users
+        keep = self.cache.pin if self.cache is not None else os.path.exists
+        self.journal = Journal(self.pptx_output, resume=self.resume)
+        print(f"Queueing {self.pptx_input}")
+        presentation = Presentation(self.pptx_input)
+        self.slide_width = presentation.slide_width
+        self.slide_height = presentation.slide_height
+        for i, slide, notes in iter_notes_slides(presentation):
+            previous = self.manifest.reusable(slide.slide_id, notes, keep=keep) if incremental else None
+            if previous is not None:
+                print(f"Reusing slide {i}, notes unchanged")
+                future = Future()
+                future.set_result(previous)
+            elif notes_hash(notes) in inflight:
+                print(f"Slide {i} has the same notes as a slide queued before, sharing its media")
+                future = inflight[notes_hash(notes)]
+            else:
+                print(f"Processing slide {i}")
+                future = executor.submit(self._process, process, i, notes, self.journal.slide(slide.slide_id, notes))
+                inflight[notes_hash(notes)] = future
+            self.users[future] += 1
+            # only the slide ID is kept, embed() opens the deck again
+            self.jobs.append((i, slide.slide_id, notes, future))
+
+    def _process(self, process, i, notes, log):
+        with telemetry.slide(self.pptx_input, i):
+            return process(i, notes, log, self)
+
+    def embed(self, embed):
+        """Embed the results in slide order, then save the deck. All python-pptx mutation happens here."""
+        presentation = Presentation(self.pptx_input)
+        slides = {slide.slide_id: slide for slide in presentation.slides}
+        embedder = MediaEmbedder(presentation, spool_dir=self.pptx_output + ".media" if self.low_memory else None)
+        checkpointer = Checkpointer(presentation, self.pptx_output, every=self.save_every, interval=self.save_interval,
+                                    manifest=self.manifest, embedder=embedder)
+        for i, slide_id, notes, future in self.jobs:
+            media, notes_text = future.result()
+            if isinstance(media, Future):
+                media = media.result()
+            print(f"Embedding slide {i} of {self.pptx_input}")
+            with telemetry.slide(self.pptx_input, i), telemetry.span("embed", bytes=os.path.getsize(media)):
+                embed(slides[slide_id], media, notes_text, embedder)
+            self.journal.slide(slide_id, notes).record("embedded", media=os.path.abspath(media))
+            self.manifest.record(slide_id, notes, media, notes_text)
+            checkpointer.slide_done()
+            self.users[future] -= 1
+            if self.users[future] == 0:
+                del self.users[future]
+                if self.cache is not None:
+                    self.cache.release(media)
+
+        print(embedder.summary())
+        checkpointer.finish()
+        embedder.close()
+        self.journal.close()
+        self.jobs = []
+        # python-pptx parts reference each other, collect them now so the deck and its media
+        # are freed before the next deck is loaded rather than whenever the collector runs
+        del presentation, slides, embedder, checkpointer
+        gc.collect()
+
+    def cancel(self):
+        for _, _, _, future in self.jobs:
+            future.cancel()
+
+
+def run_decks(decks, process, embed, workers=DEFAULT_WORKERS, incremental=False):
+    """Queue the slides of all decks on one bounded worker pool, then embed and save deck by deck.
+
+    Only the network-bound work runs on the pool, embedding happens on the calling thread.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        inflight = {}
+        users = Counter()
+        try:
+            for deck in decks:
+                deck.submit(process, executor, incremental=incremental, inflight=inflight, users=users)
+            for deck in decks:
+                deck.embed(embed)
+        except BaseException:
+            for deck in decks:
+                deck.cancel()
+            raise
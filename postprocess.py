@@ -0,0 +1,153 @@
+"""Local post-processing of the avatar videos with ffmpeg.
+
+The avatar API renders 1080p, but video.py shows the avatar in a box that covers a
+fraction of the slide. Transcoder scales every video down to the size of that box on a
+full HD screen, re-encodes it at a target bitrate and optionally extracts a poster frame,
+on its own pool of ffmpeg processes, so the other slides keep generating meanwhile.
+"""
+import os
+import shutil
+import subprocess
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from cache import cache_key
+from embedding import file_sha1
+from telemetry import in_context, telemetry
+
+DEFAULT_VIDEO_BITRATE = "500k"
+AUDIO_BITRATE = "64k"
+SCREEN_HEIGHT = 1080
+POSTER_SUFFIX = ".jpg"
+
+
+def frame_height(box_height, slide_height, screen_height=SCREEN_HEIGHT):
+    """Pixel height of a box of box_height on a slide of slide_height shown full screen, even as h264 needs it."""
+    return max(2, round(screen_height * box_height / slide_height / 2) * 2)
+
+
+class Transcoder:
+    """Re-encodes videos with ffmpeg to a given height at bitrate, workers at a time.
+
+    submit() takes the path of a video, or a Future of one, and returns a Future of the
+    transcoded video; a Future only takes a worker once its video is there. Results go
+    through the cache (keyed by the source video and the settings) and the slide journal.
+    The source video is released from the cache once it is transcoded, the transcoded
+    video is pinned in its place.
+
+    With poster, a frame of every transcoded video is cached too, poster_frame(video)
+    returns it. Posters are keyed by the video they show, so the poster of a video from
+    an earlier run is found in the cache (or extracted again). They are small, they stay
+    pinned for the rest of the run.
+    """
+
+    def __init__(self, bitrate=DEFAULT_VIDEO_BITRATE, poster=False, workers=None, cache=None):
+        self.ffmpeg = shutil.which("ffmpeg")
+        self.bitrate = bitrate
+        self.poster = poster
+        self.cache = cache
+        self.executor = ThreadPoolExecutor(max_workers=workers or os.cpu_count())
+        self.lock = threading.Lock()
+        self.transcoded = 0
+        self.source_bytes = 0
+        self.output_bytes = 0
+
+    @property
+    def available(self):
+        return self.ffmpeg is not None
+
+    def submit(self, video, height, log=None):
+        transcode = in_context(self.transcode)
+        if not isinstance(video, Future):
+            return self.executor.submit(transcode, video, height, log)
+
+        result = Future()
+
+        def resolve(done):
+            if not result.set_running_or_notify_cancel():
+                return
+            try:
+                source = done.result()
+            except BaseException as e:
+                result.set_exception(e)
+                return
+            self.executor.submit(transcode, source, height, log).add_done_callback(lambda inner: _copy_result(inner, result))
+
+        video.add_done_callback(resolve)
+        return result
+
+    def transcode(self, video, height, log=None):
+        """Return the path of video scaled down to height and re-encoded, from the journal or cache if it was done before."""
+        key = cache_key("transcode", file_sha1(video), height, self.bitrate)
+
+        def produce():
+            output = f"{uuid.uuid4()}.mp4"
+            with telemetry.span("transcode") as span:
+                self._ffmpeg("-i", video,
+                             "-map", "0:v:0", "-map", "0:a?", "-map", "0:s?",
+                             "-vf", f"scale=-2:{height}",
+                             "-c:v", "libx264", "-preset", "veryfast", "-b:v", self.bitrate,
+                             "-maxrate", self.bitrate, "-bufsize", self.bitrate,
+                             "-c:a", "aac", "-b:a", AUDIO_BITRATE, "-c:s", "mov_text",
+                             "-movflags", "+faststart", output)
+                span["bytes"] = os.path.getsize(output)
+            with self.lock:
+                self.transcoded += 1
+                self.source_bytes += os.path.getsize(video)
+                self.output_bytes += span["bytes"]
+            print(f"- Transcoded {video} to {height}p: {os.path.getsize(video):,} -> {span['bytes']:,} bytes")
+            return output
+
+        def transcoded():
+            return self.cache.file(key, ".mp4", produce, pin=True) if self.cache is not None else produce()
+
+        try:
+            if log is None:
+                output = transcoded()
+            else:
+                output = log.file("transcoded", transcoded, keep=self.cache.pin if self.cache is not None else os.path.exists)
+        finally:
+            if self.cache is not None:
+                self.cache.release(video)
+        if self.poster and self.cache is not None:
+            # extract the poster on this worker, the slide picks it up from the cache
+            self.poster_frame(output)
+        return output
+
+    def poster_frame(self, video):
+        """The poster of video, from the cache or extracted now, or None without poster."""
+        if not self.poster:
+            return None
+        if self.cache is None:
+            return self._poster(video)
+        return self.cache.file(cache_key("poster", file_sha1(video)), POSTER_SUFFIX, lambda: self._poster(video), pin=True)
+
+    def _poster(self, video):
+        poster = f"{uuid.uuid4()}{POSTER_SUFFIX}"
+        with telemetry.span("poster"):
+            # the thumbnail filter picks the most representative of the first frames
+            self._ffmpeg("-i", video, "-vf", "thumbnail", "-frames:v", "1", "-q:v", "3", poster)
+        return poster
+
+    def _ffmpeg(self, *args):
+        output = args[-1]
+        try:
+            subprocess.run([self.ffmpeg, "-nostdin", "-loglevel", "error", "-y", *args],
+                           check=True, capture_output=True, text=True)
+        except subprocess.CalledProcessError as e:
+            if os.path.exists(output):
+                os.remove(output)
+            raise RuntimeError(f"ffmpeg failed on {output}: {e.stderr.strip()}") from e
+
+    def summary(self):
+        saved = self.source_bytes - self.output_bytes
+        return (f"Transcoded {self.transcoded} video(s) at {self.bitrate}: "
+                f"{self.source_bytes:,} -> {self.output_bytes:,} bytes ({saved:,} bytes saved)")
+
+
+def _copy_result(source, target):
+    try:
+        target.set_result(source.result())
+    except BaseException as e:
+        target.set_exception(e)
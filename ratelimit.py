@@ -0,0 +1,151 @@
+import os
+import threading
+import time
+
+from telemetry import telemetry
+
+MAX_RETRIES = 6
+COMPLETION_TOKENS_ESTIMATE = 1000
+
+
+class RateLimited(Exception):
+    """Raised when a service answers with HTTP 429 (or the equivalent) outside of a Response object."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at rate_per_minute, holding at most one minute of tokens.
+
+    acquire() blocks until the requested amount is available. pause() stops handing out
+    tokens for a while, so a Retry-After seen by one thread holds back all of them.
+    A bucket without a rate only blocks while it is paused.
+    """
+
+    def __init__(self, name, rate_per_minute=None):
+        self.name = name
+        self.rate = rate_per_minute / 60 if rate_per_minute else None
+        self.capacity = rate_per_minute
+        self.tokens = rate_per_minute or 0
+        self.updated = time.monotonic()
+        self.paused_until = 0
+        self.lock = threading.Lock()
+
+    def acquire(self, amount=1):
+        if self.rate is not None:
+            amount = min(amount, self.capacity)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if self.rate is None:
+                    if now >= self.paused_until:
+                        return
+                    wait = self.paused_until - now
+                else:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if now >= self.paused_until and self.tokens >= amount:
+                        self.tokens -= amount
+                        return
+                    wait = max(self.paused_until - now, (amount - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+def _env_rate(name):
+    value = os.getenv(name)
+    return float(value) if value else None
+
+
+class RateLimits:
+    """The rate limiters shared by every deck of a run, one set of quotas per service.
+
+    Rates are per minute and come from the environment, an empty or missing value means
+    no limit: OPENAI_RPM/OPENAI_TPM (Azure OpenAI requests and tokens), SPEECH_RPM (text
+    to speech requests) and AVATAR_RPM (avatar batch synthesis API calls).
+    """
+
+    def __init__(self):
+        self.openai_requests = TokenBucket("Azure OpenAI requests", _env_rate("OPENAI_RPM"))
+        self.openai_tokens = TokenBucket("Azure OpenAI tokens", _env_rate("OPENAI_TPM"))
+        self.speech = TokenBucket("Speech", _env_rate("SPEECH_RPM"))
+        self.avatar = TokenBucket("Avatar", _env_rate("AVATAR_RPM"))
+
+    def llm(self, prompt):
+        """The reservations for one chat completion of prompt, estimating 4 characters per token."""
+        return [(self.openai_requests, 1), (self.openai_tokens, len(prompt) // 4 + COMPLETION_TOKENS_ESTIMATE)]
+
+
+_rate_limits = None
+_rate_limits_lock = threading.Lock()
+
+
+def get_rate_limits():
+    """Return the rate limits shared by the whole process, created on first use."""
+    global _rate_limits
+    with _rate_limits_lock:
+        if _rate_limits is None:
+            _rate_limits = RateLimits()
+        return _rate_limits
+
+
+def retry_after(error):
+    """Return how long to back off for a 429 response or error, or None if it isn't one."""
+    if isinstance(error, RateLimited):
+        return error.retry_after if error.retry_after is not None else 0
+
+    status = getattr(error, "status_code", None)
+    response = error if hasattr(error, "headers") else getattr(error, "response", None)
+    if status is None and response is not None:
+        status = getattr(response, "status_code", None)
+    if status != 429:
+        return None
+
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("Retry-After"):
+            return float(headers["Retry-After"])
+    except ValueError:
+        pass
+    return 0
+
+
+def call_with_retry(fn, reservations, retries=MAX_RETRIES):
+    """Call fn() once every (bucket, amount) reservation is granted, backing off on 429.
+
+    fn() may raise for a 429 or return a requests-style response with status_code 429.
+    The Retry-After of the service is honoured (exponential backoff without one), and the
+    buckets are paused for that long so concurrent callers back off as well.
+    """
+    for attempt in range(retries + 1):
+        waiting = time.monotonic()
+        for bucket, amount in reservations:
+            bucket.acquire(amount)
+        telemetry.add("rate_limit_wait", time.monotonic() - waiting)
+
+        try:
+            result = fn()
+        except Exception as e:
+            delay = retry_after(e)
+            if delay is None or attempt == retries:
+                raise
+        else:
+            if getattr(result, "status_code", None) != 429 or attempt == retries:
+                return result
+            delay = retry_after(result)
+
+        delay = delay or 2 ** attempt
+        names = ", ".join(bucket.name for bucket, _ in reservations)
+        print(f"- Rate limited by {names or 'the service'}, retrying in {delay:.1f}s")
+        telemetry.add("retries", 1)
+        for bucket, _ in reservations:
+            bucket.pause(delay)
+        if not reservations:
+            time.sleep(delay)
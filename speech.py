@@ -0,0 +1,209 @@
+import io
+import os
+import queue
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import azure.cognitiveservices.speech as speechsdk
+
+from ratelimit import RateLimited, call_with_retry, get_rate_limits
+from ssml import SentenceSplitter, build_ssml_unit
+from telemetry import in_context, telemetry
+
+SPEECH_OUTPUT_FORMAT = speechsdk.SpeechSynthesisOutputFormat.Audio24Khz96KBitRateMonoMp3
+# every Speech request has a fixed cost, so a streamed transcript is sent a few sentences at a time
+STREAM_UNIT_CHARS = 300
+
+
+def mp3_frames(data):
+    """Strip ID3 tags from an mp3 so only the audio frames remain."""
+    if data[:3] == b"ID3" and len(data) >= 10:
+        # ID3v2 header: 10 bytes followed by a syncsafe (7 bits per byte) tag size
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        footer = 10 if data[5] & 0x10 else 0
+        data = data[10 + size + footer:]
+    if len(data) >= 128 and data[-128:-125] == b"TAG":
+        data = data[:-128]
+    return data
+
+
+class _StreamSink(speechsdk.audio.PushAudioOutputStreamCallback):
+    """Receives the audio of a synthesizer as it streams in and writes it to the current target."""
+
+    def __init__(self):
+        super().__init__()
+        self.target = None
+
+    def write(self, audio_buffer: memoryview) -> int:
+        self.target.write(audio_buffer)
+        return audio_buffer.nbytes
+
+    def close(self) -> None:
+        pass
+
+
+class SynthesizerPool:
+    """Long-lived Speech SDK synthesizers shared by all slides.
+
+    Up to size synthesizers are created on first use and kept, with their connection
+    opened ahead of the first request, so several SSML requests can be in flight at once
+    without paying connection setup for every slide. Audio is streamed through a push
+    stream callback into a per-request file or buffer.
+    """
+
+    def __init__(self, size, output_format=SPEECH_OUTPUT_FORMAT):
+        self.size = size
+        self.output_format = output_format
+        self.idle = queue.Queue()
+        self.created = 0
+        self.lock = threading.Lock()
+
+    def _create(self):
+        speech_config = speechsdk.SpeechConfig(subscription=os.getenv("SPEECH_API_KEY"), region=os.getenv("SPEECH_REGION"))
+        speech_config.set_speech_synthesis_output_format(self.output_format)
+
+        sink = _StreamSink()
+        stream = speechsdk.audio.PushAudioOutputStream(sink)
+        audio_config = speechsdk.audio.AudioOutputConfig(stream=stream)
+        synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=audio_config)
+
+        connection = speechsdk.Connection.from_speech_synthesizer(synthesizer)
+        connection.open(True)
+        return synthesizer, sink, stream, connection
+
+    def _acquire(self):
+        with self.lock:
+            if self.idle.empty() and self.created < self.size:
+                self.created += 1
+                return self._create()
+        return self.idle.get()
+
+    def synthesize(self, ssml, target):
+        """Synthesize ssml, writing the audio to the binary file-like target as it arrives.
+
+        Requests count against the shared SPEECH_RPM limit and are retried when the
+        service answers with too many requests.
+        """
+        return call_with_retry(lambda: self._synthesize_once(ssml, target), [(get_rate_limits().speech, 1)])
+
+    def _synthesize_once(self, ssml, target):
+        # start over when an earlier attempt already wrote part of the audio
+        target.seek(0)
+        target.truncate()
+
+        slot = self._acquire()
+        synthesizer, sink = slot[0], slot[1]
+        try:
+            sink.target = target
+            result = synthesizer.speak_ssml_async(ssml).get()
+        finally:
+            sink.target = None
+            self.idle.put(slot)
+
+        if result.reason != speechsdk.ResultReason.SynthesizingAudioCompleted:
+            details = result.cancellation_details
+            if details.error_code == speechsdk.CancellationErrorCode.TooManyRequests:
+                raise RateLimited(f"Speech synthesis throttled: {details.error_details}")
+            raise RuntimeError(f"Speech synthesis failed: {details.reason} {details.error_details}")
+        return result
+
+    def synthesize_to_file(self, ssml, savelocation):
+        """Synthesize ssml to savelocation, which only appears once the synthesis succeeded."""
+        print(f"Creating audio {savelocation}")
+        tmp_location = f"{savelocation}.{uuid.uuid4()}.part"
+        try:
+            with open(tmp_location, "wb") as file, telemetry.span("tts") as span:
+                self.synthesize(ssml, file)
+                span["bytes"] = file.tell()
+            os.replace(tmp_location, savelocation)
+        finally:
+            if os.path.exists(tmp_location):
+                os.remove(tmp_location)
+        return savelocation
+
+    def synthesize_segments_to_file(self, segments, savelocation):
+        """Synthesize the SSML segments concurrently and join their mp3 frames in order into savelocation.
+
+        Every segment uses the same output format, so the frames are concatenated as they
+        are, without re-encoding.
+        """
+        if len(segments) == 1:
+            return self.synthesize_to_file(segments[0], savelocation)
+
+        print(f"Creating audio {savelocation} from {len(segments)} segments")
+        with ThreadPoolExecutor(max_workers=min(len(segments), self.size)) as executor:
+            parts = list(executor.map(in_context(self.synthesize_bytes), segments))
+        return write_frames(parts, savelocation)
+
+    def synthesize_bytes(self, ssml, stage="tts:segment"):
+        """Synthesize ssml into memory and return the audio."""
+        buffer = io.BytesIO()
+        with telemetry.span(stage) as span:
+            self.synthesize(ssml, buffer)
+            span["bytes"] = buffer.tell()
+        return buffer.getvalue()
+
+
+def write_frames(parts, savelocation):
+    """Join the mp3 frames of parts, all in the same output format, into savelocation without re-encoding."""
+    tmp_location = f"{savelocation}.{uuid.uuid4()}.part"
+    try:
+        with open(tmp_location, "wb") as file:
+            for part in parts:
+                file.write(mp3_frames(part))
+        os.replace(tmp_location, savelocation)
+    finally:
+        if os.path.exists(tmp_location):
+            os.remove(tmp_location)
+    return savelocation
+
+
+class StreamingSynthesis:
+    """Synthesizes a transcript while the LLM is still writing it.
+
+    feed() takes the next piece of streamed text. As soon as the complete sentences add
+    up to unit_chars characters, or a paragraph ends, they are sent to the pool, so
+    synthesis overlaps generation. finish() synthesizes the rest and joins the audio of
+    all units in order.
+    """
+
+    def __init__(self, pool, unit_chars=STREAM_UNIT_CHARS):
+        self.pool = pool
+        self.unit_chars = unit_chars
+        self.splitter = SentenceSplitter()
+        self.executor = ThreadPoolExecutor(max_workers=pool.size)
+        self.sentences = []
+        self.futures = []
+        self.fed = False
+
+    def feed(self, text):
+        self.fed = True
+        for sentence, paragraph_end in self.splitter.feed(text):
+            self._add(sentence, paragraph_end)
+
+    def _add(self, sentence, paragraph_end):
+        self.sentences.append(sentence)
+        if paragraph_end or sum(len(pending) for pending in self.sentences) >= self.unit_chars:
+            self._submit(paragraph_end)
+
+    def _submit(self, paragraph_end=False):
+        ssml = build_ssml_unit(self.sentences, paragraph_end)
+        self.futures.append(self.executor.submit(in_context(self.pool.synthesize_bytes), ssml, "tts:stream"))
+        self.sentences = []
+
+    def finish(self, savelocation):
+        """Wait for the audio of every unit and join it into savelocation."""
+        for sentence, paragraph_end in self.splitter.close():
+            self._add(sentence, paragraph_end)
+        if self.sentences:
+            self._submit()
+
+        print(f"Creating audio {savelocation} from {len(self.futures)} streamed units")
+        try:
+            return write_frames([future.result() for future in self.futures], savelocation)
+        finally:
+            self.cancel()
+
+    def cancel(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,228 @@
+import copy
+import re
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+
+SSML_VOICE = "en-US-AndrewMultilingualNeural"
+PARAGRAPH_BREAK = "750ms"
+
+_sentence_end = re.compile(r'(?:(?<=[.!?])|(?<=[.!?]["\')\]]))\s+(?=\S)')
+_emphasis = re.compile(r'\*{1,2}([^*\n]+?)\*{1,2}')
+
+
+def split_paragraphs(text):
+    return [paragraph.strip() for paragraph in re.split(r'\n\s*\n', text) if paragraph.strip()]
+
+
+def split_sentences(paragraph):
+    return [sentence.strip() for sentence in _sentence_end.split(paragraph) if sentence.strip()]
+
+
+def ssml_document(body, voice=SSML_VOICE):
+    """Wrap SSML body markup in the <speak> and <voice> elements the Speech service expects."""
+    return ('<speak version="1.0" xmlns="http://www.w3.org/2001/10/synthesis" '
+            'xmlns:mstts="http://www.w3.org/2001/mstts" xml:lang="en-US">'
+            f'<voice name="{voice}">{body}</voice></speak>')
+
+
+def build_ssml(text, voice=SSML_VOICE, paragraph_break=PARAGRAPH_BREAK):
+    """Turn a spoken transcript into SSML locally, without an LLM round trip.
+
+    Paragraphs become <p> with a pause between them, sentences become <s>, and words the
+    model marked with *asterisks* are wrapped in <emphasis>.
+    """
+    paragraphs = []
+    for paragraph in split_paragraphs(text.replace('```', '')):
+        paragraphs.append("<p>" + _sentences_markup(split_sentences(paragraph)) + "</p>")
+
+    return ssml_document(f'<break time="{paragraph_break}"/>'.join(paragraphs), voice=voice)
+
+
+def _sentences_markup(sentences):
+    marked = [_emphasis.sub(r'<emphasis level="moderate">\1</emphasis>', escape(sentence)) for sentence in sentences]
+    return "".join(f"<s>{sentence}</s>" for sentence in marked)
+
+
+def build_ssml_unit(sentences, paragraph_end=False, voice=SSML_VOICE, paragraph_break=PARAGRAPH_BREAK):
+    """SSML for a few sentences of a transcript that is synthesized piece by piece, as build_ssml() would mark them up.
+
+    The last unit of a paragraph ends with the pause build_ssml() puts between paragraphs.
+    """
+    body = _sentences_markup(sentence.replace('```', '') for sentence in sentences)
+    if paragraph_end:
+        body += f'<break time="{paragraph_break}"/>'
+    return ssml_document(body, voice=voice)
+
+
+class SentenceSplitter:
+    """Cuts text that arrives in pieces, like an LLM token stream, into complete sentences.
+
+    feed() returns the (sentence, paragraph_end) pairs completed by the new text: a sentence
+    is complete once the next one has started or its paragraph has ended. close() returns
+    what is left at the end of the stream.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+
+    def feed(self, text):
+        self.buffer += text
+        *paragraphs, self.buffer = re.split(r'\n\s*\n', self.buffer)
+        sentences = []
+        for paragraph in paragraphs:
+            sentences += _paragraph_sentences(paragraph)
+
+        # the last part can still grow, everything before it is a finished sentence
+        *finished, self.buffer = _sentence_end.split(self.buffer)
+        sentences += [(sentence.strip(), False) for sentence in finished if sentence.strip()]
+        return sentences
+
+    def close(self):
+        sentences = []
+        for paragraph in split_paragraphs(self.buffer):
+            sentences += _paragraph_sentences(paragraph)
+        self.buffer = ""
+        return sentences
+
+
+def _paragraph_sentences(paragraph):
+    sentences = split_sentences(paragraph)
+    return [(sentence, i == len(sentences) - 1) for i, sentence in enumerate(sentences)]
+
+
+SSML_NAMESPACES = {
+    "": "http://www.w3.org/2001/10/synthesis",
+    "mstts": "http://www.w3.org/2001/mstts",
+    "emo": "http://www.w3.org/2009/10/emotionml",
+}
+for _prefix, _uri in SSML_NAMESPACES.items():
+    ET.register_namespace(_prefix, _uri)
+
+
+def split_ssml(ssml, max_chars):
+    """Split an SSML document into documents of about max_chars at paragraph/sentence boundaries.
+
+    Every part keeps the <speak> and <voice> elements of the original. Parts are cut
+    between paragraphs, between the <s> of a paragraph that is too long on its own (the
+    <p> is repeated in every part) and at sentence ends in text directly inside <voice>
+    or <p>, like LLM-written SSML has. A sentence is never cut. A document that can't be
+    parsed or has no such boundaries is returned whole.
+    """
+    try:
+        speak = ET.fromstring(ssml)
+    except ET.ParseError:
+        return [ssml]
+
+    voices = [child for child in speak if _local(child.tag) == "voice"]
+    if len(speak) != 1 or len(voices) != 1:
+        return [ssml]
+    voice = voices[0]
+
+    # (group, the paragraph it was cut out of, if any)
+    groups = []
+    for group in _sentence_groups(voice):
+        if _size(group) > max_chars and _is_container(group):
+            groups += [(inner, group[0]) for inner in _sentence_groups(group[0])]
+        else:
+            groups.append((group, None))
+
+    parts = [[]]
+    size = 0
+    # the copy of the cut paragraph the last part ends with, and the paragraph it copies
+    wrapper, source = None, None
+    for group, container in groups:
+        group_size = _size(group)
+        # a pause stays with the speech before it instead of becoming a request of its own
+        is_break = len(group) == 1 and not isinstance(group[0], str) and _local(group[0].tag) == "break"
+        if parts[-1] and not is_break and size + group_size > max_chars:
+            parts.append([])
+            size = 0
+            wrapper, source = None, None
+        size += group_size
+        if container is None:
+            parts[-1] += group
+            wrapper, source = None, None
+            continue
+        # the sentences of a cut paragraph go into one copy of it per part
+        if source is not container:
+            wrapper, source = ET.Element(container.tag, container.attrib), container
+            parts[-1].append(wrapper)
+        _fill(wrapper, group)
+    if len(parts) < 2:
+        return [ssml]
+
+    documents = []
+    for pieces in parts:
+        part_speak = ET.Element(speak.tag, speak.attrib)
+        part_voice = ET.SubElement(part_speak, voice.tag, voice.attrib)
+        _fill(part_voice, pieces)
+        documents.append(ET.tostring(part_speak, encoding="unicode"))
+    return documents
+
+
+# elements a part can start or end at; paragraphs that are too long are cut between their sentences
+_SENTENCE_TAGS = {"s", "break"}
+_CONTAINER_TAGS = {"p"}
+# style elements are cut like paragraphs when they span sentences, and are inline otherwise
+_WRAPPER_TAGS = {"prosody", "express-as", "lang"}
+
+
+def _local(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def _cut_sentences(text):
+    """text cut after every sentence end, the whitespace stays with the sentence before it."""
+    cuts = [0] + [match.end() for match in _sentence_end.finditer(text)] + [len(text)]
+    return [text[start:end] for start, end in zip(cuts, cuts[1:]) if start < end]
+
+
+def _sentence_groups(element):
+    """The content of element as groups of text and child elements a part can be cut between.
+
+    Text is cut at sentence ends, inline elements like <emphasis> stay in the sentence around
+    them, and <s>, <break> and paragraphs are groups of their own.
+    """
+    groups = [[]]
+
+    def add_text(text):
+        for i, sentence in enumerate(_cut_sentences(text or "")):
+            if i > 0:
+                groups.append([])
+            groups[-1].append(sentence)
+
+    add_text(element.text)
+    for child in element:
+        piece = copy.copy(child)
+        piece.tail = None
+        tag = _local(child.tag)
+        if tag in _SENTENCE_TAGS or tag in _CONTAINER_TAGS or (tag in _WRAPPER_TAGS and len(_sentence_groups(child)) > 1):
+            groups += [[piece], []]
+        else:
+            groups[-1].append(piece)
+        add_text(child.tail)
+    return [group for group in groups if any(not isinstance(piece, str) or piece.strip() for piece in group)]
+
+
+def _is_container(group):
+    if len(group) != 1 or isinstance(group[0], str):
+        return False
+    tag = _local(group[0].tag)
+    return tag in _CONTAINER_TAGS or tag in _WRAPPER_TAGS
+
+
+def _size(group):
+    return sum(len(piece) if isinstance(piece, str) else len("".join(piece.itertext())) for piece in group)
+
+
+def _fill(parent, pieces):
+    """Append text and elements to parent in order, text after an element becomes its tail."""
+    last = None
+    for piece in pieces:
+        if not isinstance(piece, str):
+            parent.append(piece)
+            last = piece
+        elif last is None:
+            parent.text = (parent.text or "") + piece
+        else:
+            last.tail = (last.tail or "") + piece
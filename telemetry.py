@@ -0,0 +1,115 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+DEFAULT_SPANS_FILE = "telemetry.jsonl"
+
+_slide = contextvars.ContextVar("slide", default=(None, None))
+_span = contextvars.ContextVar("span", default=None)
+
+
+def in_context(fn):
+    """Wrap fn so it runs in a copy of the current context, for work handed to another thread."""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(fn, *args, **kwargs)
+
+
+class Telemetry:
+    """Per-stage spans of a run, written as JSON lines and summarized at the end.
+
+    A span records the deck and slide it belongs to, its stage, start and wall time and
+    whatever counters the stage fills in: prompt/completion tokens, bytes transferred and
+    retries. Spans pick up the deck and slide of the surrounding slide() block.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.spans = []
+        self.file = None
+        self.started = time.time()
+
+    def open(self, path):
+        self.file = open(path, "w", encoding="utf-8") if path else None
+        self.started = time.time()
+
+    @contextmanager
+    def slide(self, deck, slide):
+        token = _slide.set((os.path.basename(deck), slide))
+        try:
+            yield
+        finally:
+            _slide.reset(token)
+
+    def current(self):
+        """The counters of the innermost open span, or None outside of a span."""
+        return _span.get()
+
+    @contextmanager
+    def span(self, stage, **attributes):
+        counters = dict(attributes)
+        token = _span.set(counters)
+        start = time.time()
+        try:
+            yield counters
+        except BaseException as e:
+            counters["error"] = type(e).__name__
+            raise
+        finally:
+            _span.reset(token)
+            self.record(stage, start, time.time(), **counters)
+
+    def record(self, stage, start, end, deck=None, slide=None, **counters):
+        if deck is None and slide is None:
+            deck, slide = _slide.get()
+        entry = {"deck": deck, "slide": slide, "stage": stage, "start": start, "wall": end - start, **counters}
+        with self.lock:
+            self.spans.append(entry)
+            if self.file is not None:
+                self.file.write(json.dumps(entry) + "\n")
+                self.file.flush()
+
+    def add(self, name, value):
+        """Add value to a counter of the innermost open span."""
+        counters = _span.get()
+        if counters is not None:
+            counters[name] = counters.get(name, 0) + value
+
+    def report(self):
+        with self.lock:
+            spans = list(self.spans)
+        if not spans:
+            return
+
+        print(f"Run report ({time.time() - self.started:.1f}s wall)")
+        print(f"{'stage':<18}{'count':>7}{'total s':>10}{'mean s':>9}{'max s':>9}{'tokens in':>11}{'tokens out':>11}{'bytes':>15}{'retries':>9}")
+        stages = defaultdict(list)
+        for span in spans:
+            stages[span["stage"]].append(span)
+        for stage, items in sorted(stages.items(), key=lambda item: -sum(span["wall"] for span in item[1])):
+            total = sum(span["wall"] for span in items)
+            print(f"{stage:<18}{len(items):>7}{total:>10.1f}{total / len(items):>9.2f}{max(span['wall'] for span in items):>9.2f}"
+                  f"{sum(span.get('prompt_tokens') or 0 for span in items):>11,}"
+                  f"{sum(span.get('completion_tokens') or 0 for span in items):>11,}"
+                  f"{sum(span.get('bytes') or 0 for span in items):>15,}"
+                  f"{sum(span.get('retries') or 0 for span in items):>9}")
+
+        # the slide whose work finished last holds up the final embed and save of its deck
+        slides = defaultdict(list)
+        for span in spans:
+            if span["slide"] is not None and span["stage"] != "embed":
+                slides[(span["deck"], span["slide"])].append(span)
+        if not slides:
+            return
+        (deck, slide), items = max(slides.items(), key=lambda item: max(span["start"] + span["wall"] for span in item[1]))
+        items.sort(key=lambda span: span["start"])
+        end = max(span["start"] + span["wall"] for span in items)
+        print(f"Critical path: {deck} slide {slide}, done {end - self.started:.1f}s into the run")
+        for span in items:
+            print(f"  {span['start'] - self.started:>8.1f}s  {span['stage']:<18}{span['wall']:>8.2f}s")
+
+
+telemetry = Telemetry()
@@ -0,0 +1,114 @@
+import itertools
+import os
+import time
+
+from cache import HTTP_CACHE_DIR, Cache, cache_key
+
+
+_clock = itertools.count()
+
+
+def put(cache, tmp_path, name, size):
+    """Add an entry of size bytes, newer than every entry before it; names starting with pinned are pinned."""
+    source = tmp_path / f"{name}.src"
+    source.write_bytes(b"x" * size)
+    path = cache.put_file(cache_key(name), ".mp3", str(source), pin=name.startswith("pinned"))
+    # modification times order the LRU, keep them apart on filesystems with a coarse clock
+    stamp = time.time() - 1000 + next(_clock)
+    os.utime(path, (stamp, stamp))
+    return path
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = Cache(str(tmp_path / "cache"), max_bytes=250)
+    first = put(cache, tmp_path, "first", 100)
+    second = put(cache, tmp_path, "second", 100)
+    third = put(cache, tmp_path, "third", 100)
+
+    assert not os.path.exists(first)
+    assert os.path.exists(second) and os.path.exists(third)
+    assert cache.evictions == 1
+
+
+def test_hit_refreshes_entry(tmp_path):
+    cache = Cache(str(tmp_path / "cache"), max_bytes=250)
+    first = put(cache, tmp_path, "first", 100)
+    second = put(cache, tmp_path, "second", 100)
+    assert cache.get_file(cache_key("first"), ".mp3") == first
+    put(cache, tmp_path, "third", 100)
+
+    assert os.path.exists(first)
+    assert not os.path.exists(second)
+
+
+def test_pending_media_is_not_evicted(tmp_path):
+    # a worker returned the media, the deck has not embedded it yet
+    cache = Cache(str(tmp_path / "cache"), max_bytes=150)
+    pending = put(cache, tmp_path, "pinned", 100)
+    for name in ("a", "b", "c"):
+        put(cache, tmp_path, name, 100)
+    assert os.path.exists(pending)
+
+    cache.release(pending)
+    put(cache, tmp_path, "d", 100)
+    assert not os.path.exists(pending)
+
+
+def test_pin_counts_every_user(tmp_path):
+    cache = Cache(str(tmp_path / "cache"), max_bytes=150)
+    pending = put(cache, tmp_path, "pinned", 100)
+    assert cache.pin(pending)
+
+    cache.release(pending)
+    put(cache, tmp_path, "a", 100)
+    assert os.path.exists(pending)
+
+    cache.release(pending)
+    put(cache, tmp_path, "b", 100)
+    assert not os.path.exists(pending)
+
+
+def test_pin_of_missing_file(tmp_path):
+    cache = Cache(str(tmp_path / "cache"))
+    assert not cache.pin(str(tmp_path / "gone.mp3"))
+
+
+def test_file_pins_hits_and_misses(tmp_path):
+    cache = Cache(str(tmp_path / "cache"), max_bytes=150)
+    source = tmp_path / "media.src"
+    source.write_bytes(b"x" * 100)
+    path = cache.file(cache_key("media"), ".mp3", lambda: str(source), pin=True)
+    assert cache.file(cache_key("media"), ".mp3", lambda: None, pin=True) == path
+
+    put(cache, tmp_path, "a", 100)
+    cache.release(path)
+    put(cache, tmp_path, "b", 100)
+    assert os.path.exists(path)
+
+
+def test_http_responses_are_not_managed(tmp_path):
+    directory = tmp_path / "cache"
+    (directory / HTTP_CACHE_DIR).mkdir(parents=True)
+    response = directory / HTTP_CACHE_DIR / "page.body"
+    response.write_bytes(b"x" * 1000)
+
+    cache = Cache(str(directory), max_bytes=150)
+    assert cache.size == 0
+    put(cache, tmp_path, "a", 100)
+    put(cache, tmp_path, "b", 100)
+    assert response.exists()
+
+
+def test_text_round_trip(tmp_path):
+    cache = Cache(str(tmp_path / "cache"))
+    assert cache.text(cache_key("prompt"), lambda: "answer") == "answer"
+    assert cache.text(cache_key("prompt"), lambda: "other") == "answer"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_without_directory_never_hits(tmp_path):
+    cache = Cache(None)
+    calls = []
+    assert cache.text("key", lambda: calls.append(1) or "answer") == "answer"
+    assert cache.text("key", lambda: calls.append(1) or "answer") == "answer"
+    assert len(calls) == 2
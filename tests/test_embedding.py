@@ -0,0 +1,64 @@
+import os
+import zipfile
+
+from pptx import Presentation
+from pptx.util import Cm
+
+from embedding import MediaEmbedder
+from pipeline import save_presentation
+
+
+def media_file(tmp_path, name, size):
+    path = tmp_path / name
+    path.write_bytes(os.urandom(size))
+    return str(path)
+
+
+def build_deck(media, spool_dir=None):
+    presentation = Presentation()
+    embedder = MediaEmbedder(presentation, spool_dir=spool_dir)
+    for path in media:
+        slide = presentation.slides.add_slide(presentation.slide_layouts[6])
+        embedder.add_movie(slide, path, Cm(1), Cm(1), Cm(4), Cm(3), mime_type="audio/mpeg")
+    return presentation, embedder
+
+
+def media_members(pptx):
+    with zipfile.ZipFile(pptx) as package:
+        return {info.filename: (info.compress_type, package.read(info))
+                for info in package.infolist() if info.filename.startswith("ppt/media/media")}
+
+
+def test_low_memory_deck_matches_the_in_memory_one(tmp_path):
+    first = media_file(tmp_path, "first.mp3", 300_000)
+    second = media_file(tmp_path, "second.mp3", 200_000)
+    media = [first, second, first]
+
+    presentation, embedder = build_deck(media)
+    save_presentation(presentation, str(tmp_path / "in-memory.pptx"), embedder)
+
+    spool_dir = str(tmp_path / "spool")
+    presentation, embedder = build_deck(media, spool_dir=spool_dir)
+    # the spool keeps the media once the cache evicts it
+    os.remove(first)
+    os.remove(second)
+    output = str(tmp_path / "low-memory.pptx")
+    save_presentation(presentation, output, embedder)
+    embedder.close()
+
+    expected = {name: data for name, (_, data) in media_members(tmp_path / "in-memory.pptx").items()}
+    written = media_members(output)
+    assert len(written) == 2
+    assert {name: data for name, (_, data) in written.items()} == expected
+    assert all(compress_type == zipfile.ZIP_STORED for compress_type, _ in written.values())
+    assert embedder.duplicates == 1
+    assert not os.path.exists(spool_dir)
+    assert [path.name for path in tmp_path.iterdir() if path.name.endswith(".tmp")] == []
+
+    # the deck opens and every slide plays its own media
+    blobs = []
+    for slide in Presentation(output).slides:
+        movie = slide.shapes[0]
+        blobs.append(slide.part.related_part(movie._element.xpath(".//a:videoFile/@r:link")[0]).blob)
+    assert blobs[0] == blobs[2] != blobs[1]
+    assert [len(blob) for blob in blobs] == [300_000, 200_000, 300_000]
@@ -0,0 +1,83 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from fetch import Fetcher
+
+
+class PageServer:
+    """Serves a page with an ETag and answers 304 while the page did not change."""
+
+    def __init__(self):
+        self.body = b"<html><body><p>First version</p></body></html>"
+        self.requests = []
+        self.on_conditional = None
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                etag = f'"{hash(server.body)}"'
+                condition = self.headers.get("If-None-Match")
+                if condition is not None and server.on_conditional is not None:
+                    server.on_conditional()
+                status = 304 if condition == etag else 200
+                server.requests.append((condition is not None, status))
+                body = server.body if status == 200 else b""
+                self.send_response(status)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/docs/page"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+
+@pytest.fixture
+def server():
+    server = PageServer()
+    yield server
+    server.httpd.shutdown()
+
+
+def test_cached_page_is_revalidated_by_the_next_run(server, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    first = Fetcher(cache_dir)
+    assert first.get(server.url) == server.body
+    # within a run the page is fetched once
+    assert first.get(server.url) == server.body
+    assert server.requests == [(False, 200)]
+
+    assert Fetcher(cache_dir).get(server.url) == server.body
+    assert server.requests[1] == (True, 304)
+
+    server.body = b"<html><body><p>Second version</p></body></html>"
+    assert Fetcher(cache_dir).get(server.url) == server.body
+    assert Fetcher(cache_dir).get(server.url) == server.body
+    assert server.requests[2:] == [(True, 200), (True, 304)]
+
+
+def test_page_is_fetched_again_when_the_cached_copy_goes_away(server, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    Fetcher(cache_dir).get(server.url)
+    fetcher = Fetcher(cache_dir)
+    _, body_path = fetcher._cache_paths(server.url)
+    server.on_conditional = lambda: os.remove(body_path)
+
+    assert fetcher.get(server.url) == server.body
+    assert server.requests == [(False, 200), (True, 304), (False, 200)]
+
+
+def test_without_cache_dir_nothing_is_stored(server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    Fetcher().get(server.url)
+    Fetcher().get(server.url)
+
+    assert server.requests == [(False, 200), (False, 200)]
+    assert os.listdir(tmp_path) == []
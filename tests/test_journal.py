@@ -0,0 +1,69 @@
+import json
+
+from journal import Journal
+
+
+def test_resume_replays_finished_stages(tmp_path):
+    output = str(tmp_path / "deck-audio.pptx")
+    journal = Journal(output)
+    journal.slide(256, "notes").record("transcript", value="hello")
+    journal.close()
+
+    resumed = Journal(output, resume=True)
+    log = resumed.slide(256, "notes")
+    assert log.text("transcript", lambda: "generated again") == "hello"
+    resumed.close()
+
+
+def test_changed_notes_start_over(tmp_path):
+    output = str(tmp_path / "deck-audio.pptx")
+    journal = Journal(output)
+    journal.slide(256, "notes").record("transcript", value="hello")
+    journal.close()
+
+    resumed = Journal(output, resume=True)
+    assert resumed.slide(256, "edited notes").text("transcript", lambda: "new") == "new"
+    resumed.close()
+
+
+def test_incomplete_last_line_is_ignored(tmp_path):
+    output = str(tmp_path / "deck-audio.pptx")
+    journal = Journal(output)
+    journal.slide(256, "notes").record("transcript", value="hello")
+    journal.close()
+    with open(output + ".journal.jsonl", "a", encoding="utf-8") as file:
+        file.write('{"slide": "256", "notes_sha')
+
+    resumed = Journal(output, resume=True)
+    assert resumed.slide(256, "notes").get("transcript")["value"] == "hello"
+    resumed.close()
+
+
+def test_without_resume_the_journal_starts_empty(tmp_path):
+    output = str(tmp_path / "deck-audio.pptx")
+    journal = Journal(output)
+    journal.slide(256, "notes").record("transcript", value="hello")
+    journal.close()
+
+    fresh = Journal(output)
+    assert fresh.slide(256, "notes").get("transcript") is None
+    fresh.close()
+    with open(output + ".journal.jsonl", encoding="utf-8") as file:
+        assert file.read() == ""
+
+
+def test_file_is_produced_again_when_it_is_gone(tmp_path):
+    output = str(tmp_path / "deck-audio.pptx")
+    media = tmp_path / "slide.mp3"
+    media.write_bytes(b"audio")
+    journal = Journal(output)
+    log = journal.slide(256, "notes")
+    assert log.file("media", lambda: str(media)) == str(media)
+
+    assert log.file("media", lambda: "unused") == str(media)
+    assert log.file("media", lambda: "other.mp3", keep=lambda path: False) == "other.mp3"
+    journal.close()
+
+    with open(output + ".journal.jsonl", encoding="utf-8") as file:
+        stages = [json.loads(line)["stage"] for line in file]
+    assert stages == ["media", "media"]
@@ -0,0 +1,136 @@
+import os
+import random
+import time
+
+from pptx import Presentation
+
+from cache import Cache, cache_key
+from pipeline import Checkpointer, Deck, Manifest, find_decks, run_decks
+
+
+def touch(path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"")
+    return str(path)
+
+
+def test_find_decks_in_directory(tmp_path):
+    first = touch(tmp_path / "b.pptx")
+    second = touch(tmp_path / "a.pptx")
+    touch(tmp_path / "a-audio.pptx")
+    touch(tmp_path / "~$a.pptx")
+    touch(tmp_path / "notes.txt")
+
+    assert find_decks([str(tmp_path)], "-audio") == [
+        (second, str(tmp_path / "a-audio.pptx")),
+        (first, str(tmp_path / "b-audio.pptx")),
+    ]
+
+
+def test_find_decks_with_output_dir(tmp_path):
+    deck = touch(tmp_path / "in" / "deck.pptx")
+    assert find_decks([deck], "-video", output_dir="out") == [(deck, os.path.join("out", "deck-video.pptx"))]
+
+
+def test_manifest_reuses_unchanged_slides(tmp_path):
+    output = str(tmp_path / "deck-audio.pptx")
+    media = touch(tmp_path / "slide.mp3")
+    manifest = Manifest(output)
+    manifest.record(256, "notes", media, "questions")
+    manifest.save()
+
+    previous = Manifest(output)
+    assert previous.reusable(256, "notes") == (media, "questions")
+    assert previous.reusable(256, "edited notes") is None
+    assert previous.reusable(257, "notes") is None
+    assert previous.reusable(256, "notes", keep=lambda path: False) is None
+
+    os.remove(media)
+    assert previous.reusable(256, "notes") is None
+
+
+def test_checkpoints_keep_the_slides_of_the_previous_run(tmp_path):
+    output = str(tmp_path / "deck-audio.pptx")
+    media = [touch(tmp_path / f"{i}.mp3") for i in range(3)]
+    manifest = Manifest(output)
+    for slide_id, path in zip([256, 257, 258], media):
+        manifest.record(slide_id, "notes", path, "")
+    manifest.save()
+
+    manifest = Manifest(output)
+    checkpointer = Checkpointer(Presentation(), output, every=1, manifest=manifest)
+    manifest.record(256, "edited notes", media[0], "")
+    checkpointer.slide_done()
+
+    # a run interrupted here can still reuse slides 257 and 258
+    interrupted = Manifest(output)
+    assert interrupted.reusable(256, "edited notes") == (media[0], "")
+    assert interrupted.reusable(257, "notes") == (media[1], "")
+    assert interrupted.reusable(258, "notes") == (media[2], "")
+
+    # slide 258 was deleted from the deck, the finished run forgets it
+    manifest.record(257, "notes", media[1], "")
+    checkpointer.slide_done()
+    checkpointer.finish()
+    assert sorted(Manifest(output).previous) == ["256", "257"]
+
+
+def make_deck(path, notes):
+    presentation = Presentation()
+    for text in notes:
+        slide = presentation.slides.add_slide(presentation.slide_layouts[6])
+        slide.notes_slide.notes_text_frame.text = text
+    presentation.save(path)
+
+
+def test_cache_keeps_media_until_it_is_embedded(tmp_path):
+    deck = str(tmp_path / "deck.pptx")
+    # slide 7 repeats slide 1, so its media is embedded twice
+    make_deck(deck, [f"notes {i}" for i in range(6)] + ["notes 0"])
+    # room for one media file, every other one is evicted as soon as it is cached
+    cache = Cache(str(tmp_path / "cache"), max_bytes=150)
+    rng = random.Random(0)
+    delays = {f"notes {i}": rng.uniform(0, 0.05) for i in range(6)}
+
+    def process(i, notes, log, deck):
+        # slides finish out of order
+        time.sleep(delays[notes])
+        source = tmp_path / f"{i}.mp3"
+        source.write_bytes(notes.encode("utf-8") * 20)
+        return cache.put_file(cache_key(notes), ".mp3", str(source), pin=True), ""
+
+    embedded = []
+
+    def embed(slide, media, notes_text, embedder):
+        with open(media, "rb") as file:
+            embedded.append(file.read()[:7])
+
+    run_decks([Deck(deck, str(tmp_path / "deck-audio.pptx"), cache=cache)], process, embed, workers=6)
+
+    assert embedded == [b"notes 0", b"notes 1", b"notes 2", b"notes 3", b"notes 4", b"notes 5", b"notes 0"]
+    assert not cache.pinned
+
+
+def test_checkpointer_saves_every_n_slides_and_once_at_the_end(tmp_path):
+    output = str(tmp_path / "deck-audio.pptx")
+    checkpointer = Checkpointer(Presentation(), output, every=2)
+    for _ in range(4):
+        checkpointer.slide_done()
+    assert checkpointer.saves == 2
+
+    # nothing was embedded since the last checkpoint
+    checkpointer.finish()
+    assert checkpointer.saves == 2
+
+    checkpointer.slide_done()
+    checkpointer.finish()
+    assert checkpointer.saves == 3
+    assert os.path.exists(output)
+
+
+def test_checkpointer_always_writes_the_deck(tmp_path):
+    output = str(tmp_path / "deck-audio.pptx")
+    checkpointer = Checkpointer(Presentation(), output)
+    checkpointer.finish()
+    assert checkpointer.saves == 1
+    assert os.path.exists(output)
@@ -0,0 +1,83 @@
+import os
+import sys
+
+import pytest
+
+from cache import Cache
+from postprocess import Transcoder, frame_height
+
+FAKE_FFMPEG = """#!{python}
+import sys
+
+args = sys.argv[1:]
+source, output = args[args.index("-i") + 1], args[-1]
+with open({calls!r}, "a") as calls:
+    calls.write(output.rsplit(".", 1)[1] + "\\n")
+with open(source, "rb") as file:
+    data = file.read()
+with open(output, "wb") as file:
+    file.write(b"poster of " + data if output.endswith(".jpg") else data[:len(data) // 8])
+"""
+
+
+@pytest.fixture
+def ffmpeg(tmp_path, monkeypatch):
+    """A stand-in for ffmpeg that shrinks videos and makes posters, returning the list of outputs it made."""
+    calls = tmp_path / "calls"
+    calls.write_text("")
+    path = tmp_path / "ffmpeg"
+    path.write_text(FAKE_FFMPEG.format(python=sys.executable, calls=str(calls)))
+    path.chmod(0o755)
+    monkeypatch.chdir(tmp_path)
+    return path, lambda: calls.read_text().split()
+
+
+def transcoder(ffmpeg, cache):
+    transcoder = Transcoder(poster=True, workers=2, cache=cache)
+    transcoder.ffmpeg = str(ffmpeg[0])
+    return transcoder
+
+
+def test_frame_height_is_even():
+    assert frame_height(4, 10) == 432
+    assert frame_height(7.64, 19.05) == 434
+    assert frame_height(1, 10000) == 2
+
+
+def test_later_runs_find_the_poster_of_a_reused_video(tmp_path, ffmpeg):
+    source = tmp_path / "rendered.mp4"
+    source.write_bytes(os.urandom(8000))
+    cache = Cache(str(tmp_path / "cache"))
+
+    first = transcoder(ffmpeg, cache)
+    output = first.submit(str(source), 434).result(timeout=10)
+    assert os.path.getsize(output) == 1000
+    poster = first.poster_frame(output)
+    with open(output, "rb") as video, open(poster, "rb") as image:
+        assert image.read() == b"poster of " + video.read()
+    assert ffmpeg[1]() == ["mp4", "jpg"]
+
+    # an incremental run embeds the transcoded video of the manifest without transcoding it
+    assert transcoder(ffmpeg, Cache(str(tmp_path / "cache"))).poster_frame(output) == poster
+    assert ffmpeg[1]() == ["mp4", "jpg"]
+
+
+def test_poster_is_extracted_again_once_evicted(tmp_path, ffmpeg):
+    video = tmp_path / "video.mp4"
+    video.write_bytes(os.urandom(1000))
+    cache = Cache(str(tmp_path / "cache"))
+    poster = transcoder(ffmpeg, cache).poster_frame(str(video))
+    cache.release(poster)
+    os.remove(poster)
+
+    assert os.path.exists(transcoder(ffmpeg, cache).poster_frame(str(video)))
+    assert ffmpeg[1]() == ["jpg", "jpg"]
+
+
+def test_without_poster_there_is_none(tmp_path, ffmpeg):
+    video = tmp_path / "video.mp4"
+    video.write_bytes(os.urandom(1000))
+    plain = Transcoder(cache=Cache(str(tmp_path / "cache")))
+    plain.ffmpeg = str(ffmpeg[0])
+    assert plain.poster_frame(str(video)) is None
+    assert ffmpeg[1]() == []
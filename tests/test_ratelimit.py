@@ -0,0 +1,89 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from ratelimit import RateLimited, TokenBucket, call_with_retry, retry_after
+
+
+def response(status, **headers):
+    return SimpleNamespace(status_code=status, headers=headers)
+
+
+def test_retry_after_of_responses_and_errors():
+    assert retry_after(response(200)) is None
+    assert retry_after(response(429)) == 0
+    assert retry_after(response(429, **{"Retry-After": "3"})) == 3
+    assert retry_after(response(429, **{"retry-after-ms": "250"})) == 0.25
+    assert retry_after(response(429, **{"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"})) == 0
+    assert retry_after(RateLimited("throttled", retry_after=2)) == 2
+    assert retry_after(ValueError("not a 429")) is None
+
+    error = Exception("throttled")
+    error.response = response(429, **{"retry-after-ms": "100"})
+    assert retry_after(error) == 0.1
+
+
+def test_bucket_without_rate_only_blocks_while_paused():
+    bucket = TokenBucket("unlimited")
+    start = time.monotonic()
+    for _ in range(1000):
+        bucket.acquire(100)
+    assert time.monotonic() - start < 0.5
+
+    bucket.pause(0.2)
+    start = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - start >= 0.19
+
+
+def test_bucket_blocks_once_empty():
+    bucket = TokenBucket("fast", rate_per_minute=600)
+    bucket.acquire(600)
+    start = time.monotonic()
+    bucket.acquire(2)
+    # 600 per minute is one token every 0.1 seconds
+    assert 0.15 <= time.monotonic() - start < 1
+
+
+def test_pause_holds_back_every_caller():
+    bucket = TokenBucket("paused", rate_per_minute=6000)
+    bucket.pause(0.2)
+    start = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - start >= 0.19
+
+
+@pytest.mark.parametrize("rate", [None, 6000])
+def test_call_with_retry_waits_out_throttled_responses(rate):
+    answers = [response(429, **{"retry-after-ms": "100"}), response(429, **{"retry-after-ms": "100"}), response(200)]
+    bucket = TokenBucket("service", rate_per_minute=rate)
+    start = time.monotonic()
+    assert call_with_retry(lambda: answers.pop(0), [(bucket, 1)]).status_code == 200
+    assert answers == []
+    assert time.monotonic() - start >= 0.19
+
+
+def test_call_with_retry_raises_other_errors_at_once():
+    calls = []
+
+    def fail():
+        calls.append(1)
+        raise ValueError("broken")
+
+    with pytest.raises(ValueError):
+        call_with_retry(fail, [])
+    assert len(calls) == 1
+
+
+def test_call_with_retry_gives_up():
+    calls = []
+
+    def throttled():
+        calls.append(time.monotonic())
+        raise RateLimited("throttled", retry_after=0.05)
+
+    with pytest.raises(RateLimited):
+        call_with_retry(throttled, [], retries=2)
+    assert len(calls) == 3
+    assert calls[-1] - calls[0] >= 0.09
@@ -0,0 +1,31 @@
+from speech import mp3_frames, write_frames
+
+FRAMES = b"\xff\xfb\x90\x00" + bytes(range(256)) * 4
+
+
+def id3v2(payload, footer=False):
+    size = len(payload)
+    syncsafe = bytes([(size >> 21) & 0x7f, (size >> 14) & 0x7f, (size >> 7) & 0x7f, size & 0x7f])
+    flags = 0x10 if footer else 0
+    return b"ID3\x04\x00" + bytes([flags]) + syncsafe + payload + (b"3DI" + b"\x00" * 7 if footer else b"")
+
+
+def test_plain_frames_are_kept():
+    assert mp3_frames(FRAMES) == FRAMES
+
+
+def test_id3v2_tag_is_stripped():
+    assert mp3_frames(id3v2(b"T" * 300) + FRAMES) == FRAMES
+    assert mp3_frames(id3v2(b"T" * 300, footer=True) + FRAMES) == FRAMES
+
+
+def test_id3v1_tag_is_stripped():
+    assert mp3_frames(FRAMES + b"TAG" + b"\x00" * 125) == FRAMES
+
+
+def test_write_frames_joins_parts_in_order(tmp_path):
+    target = tmp_path / "slide.mp3"
+    parts = [id3v2(b"T" * 20) + FRAMES, FRAMES[::-1], FRAMES + b"TAG" + b"\x00" * 125]
+    assert write_frames(parts, str(target)) == str(target)
+    assert target.read_bytes() == FRAMES + FRAMES[::-1] + FRAMES
+    assert [path.name for path in tmp_path.iterdir()] == ["slide.mp3"]
@@ -0,0 +1,104 @@
+import xml.etree.ElementTree as ET
+
+from ssml import SentenceSplitter, build_ssml, split_sentences, split_ssml, ssml_document
+
+NS = "{http://www.w3.org/2001/10/synthesis}"
+
+
+def spoken(document):
+    """The text of an SSML document, with a space between its elements like <s>."""
+    return " ".join(ET.fromstring(document).itertext()).strip()
+
+
+def words(documents):
+    return " ".join(spoken(document) for document in documents).split()
+
+
+def test_build_ssml_marks_up_paragraphs_sentences_and_emphasis():
+    ssml = build_ssml("One. Two is *key*!\n\nThree.")
+    assert "<p><s>One.</s><s>Two is <emphasis level=\"moderate\">key</emphasis>!</s></p>" in ssml
+    assert '<break time="750ms"/><p><s>Three.</s></p>' in ssml
+
+
+def test_short_document_is_returned_whole():
+    ssml = build_ssml("One sentence. Another one.")
+    assert split_ssml(ssml, 1000) == [ssml]
+
+
+def test_invalid_document_is_returned_whole():
+    assert split_ssml("<speak><voice>broken", 10) == ["<speak><voice>broken"]
+
+
+def test_llm_ssml_is_split_at_sentence_ends():
+    # LLM-written SSML has the text directly inside <voice>
+    ssml = ssml_document("First sentence here. Second one <emphasis>matters</emphasis> a lot! "
+                         "Third sentence now. Fourth and last.", voice="en-US-JennyNeural")
+    parts = split_ssml(ssml, 40)
+
+    assert len(parts) > 1
+    assert words(parts) == spoken(ssml).split()
+    # inline elements stay in their sentence
+    assert any("Second one" in spoken(part) and part.count("emphasis") == 2 for part in parts)
+    for part in parts:
+        voice = ET.fromstring(part).find(f"{NS}voice")
+        assert voice.get("name") == "en-US-JennyNeural"
+
+
+def test_long_paragraph_is_split_between_its_sentences():
+    text = " ".join(f"Sentence number {i} is here." for i in range(8))
+    ssml = build_ssml(text)
+    parts = split_ssml(ssml, 60)
+
+    assert len(parts) == 4
+    assert words(parts) == spoken(ssml).split()
+    for part in parts:
+        # every part is one paragraph of whole sentences
+        voice = ET.fromstring(part).find(f"{NS}voice")
+        assert [child.tag for child in voice] == [f"{NS}p"]
+        assert [child.tag for child in voice[0]] == [f"{NS}s", f"{NS}s"]
+
+
+def test_paragraph_break_stays_with_the_speech_before_it():
+    ssml = build_ssml("First paragraph is here.\n\nSecond paragraph is here.")
+    parts = split_ssml(ssml, 30)
+
+    assert len(parts) == 2
+    assert parts[0].endswith('<break time="750ms" /></voice></speak>')
+    assert "Second paragraph" in spoken(parts[1])
+
+
+def test_sentence_is_never_cut():
+    sentence = "This single sentence is much longer than the limit of a part."
+    parts = split_ssml(build_ssml(sentence + " Short."), 10)
+    assert spoken(parts[0]) == sentence
+
+
+def test_style_element_spanning_sentences_is_repeated_in_every_part():
+    ssml = ('<speak version="1.0" xmlns="http://www.w3.org/2001/10/synthesis" '
+            'xmlns:mstts="http://www.w3.org/2001/mstts" xml:lang="en-US"><voice name="x">'
+            '<mstts:express-as style="cheerful">One is here. Two is here. Three is here.</mstts:express-as>'
+            '</voice></speak>')
+    parts = split_ssml(ssml, 15)
+
+    assert len(parts) == 3
+    assert all('style="cheerful"' in part for part in parts)
+    assert words(parts) == spoken(ssml).split()
+
+
+def test_sentence_splitter_matches_split_sentences():
+    text = "First sentence. Second one? Third!\n\nNew paragraph here. And the end."
+    splitter = SentenceSplitter()
+    sentences = []
+    for start in range(0, len(text), 7):
+        sentences += splitter.feed(text[start:start + 7])
+    sentences += splitter.close()
+
+    assert [sentence for sentence, _ in sentences] == split_sentences(text.replace("\n\n", " "))
+    assert [end for _, end in sentences] == [False, False, True, False, True]
+
+
+def test_sentence_splitter_waits_for_the_next_sentence():
+    splitter = SentenceSplitter()
+    assert splitter.feed("Dr. Smith") == [("Dr.", False)]
+    assert splitter.feed(" arrives") == []
+    assert splitter.close() == [("Smith arrives", True)]
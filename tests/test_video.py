@@ -0,0 +1,141 @@
+import itertools
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import video
+from video import AvatarPoller
+
+
+class FakeJobs:
+    """Stands in for the batch avatar synthesis API: every job runs for a few status checks."""
+
+    def __init__(self, checks=2, statuses=None):
+        self.checks = checks
+        self.statuses = statuses or {}
+        self.ids = itertools.count()
+        self.polled = {}
+        self.transcripts = {}
+
+    def submit(self, job_id, transcript):
+        self.transcripts[job_id] = transcript
+        return True
+
+    def get(self, job_id):
+        self.polled[job_id] = self.polled.get(job_id, 0) + 1
+        if self.polled[job_id] < self.checks:
+            return {"status": "Running"}
+        return self.statuses.get(self.transcripts[job_id],
+                                 {"status": "Succeeded", "outputs": {"result": f"https://files/{job_id}.mp4"}})
+
+
+@pytest.fixture
+def jobs(monkeypatch, tmp_path):
+    jobs = FakeJobs()
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(video.uuid, "uuid4", lambda: f"job{next(jobs.ids)}")
+    monkeypatch.setattr(video, "submit_synthesis", jobs.submit)
+    monkeypatch.setattr(video, "get_synthesis", jobs.get)
+
+    def download_video(url, filename):
+        with open(filename, "w", encoding="utf-8") as file:
+            file.write(url)
+        return filename
+
+    monkeypatch.setattr(video, "download_video", download_video)
+    return jobs
+
+
+def test_every_job_is_downloaded_once_it_succeeds(jobs):
+    poller = AvatarPoller(initial_delay=0.01, max_delay=0.05)
+    futures = [poller.submit(f"transcript {i}") for i in range(3)]
+
+    assert [future.result(timeout=5) for future in futures] == ["job0.mp4", "job1.mp4", "job2.mp4"]
+    with open("job1.mp4", encoding="utf-8") as file:
+        assert file.read() == "https://files/job1.mp4"
+    # one thread checks all the jobs, each until it is done
+    assert jobs.polled == {"job0": 2, "job1": 2, "job2": 2}
+
+
+def test_failed_and_malformed_jobs_do_not_stop_the_poller(jobs):
+    jobs.statuses = {"failed": {"status": "Failed"}, "malformed": {"status": "Succeeded"}}
+    poller = AvatarPoller(initial_delay=0.01, max_delay=0.05)
+    failed = poller.submit("failed")
+    malformed = poller.submit("malformed")
+
+    with pytest.raises(RuntimeError, match="job0 failed"):
+        failed.result(timeout=5)
+    with pytest.raises(RuntimeError, match="Checking batch avatar synthesis job job1 failed"):
+        malformed.result(timeout=5)
+    assert poller.submit("later").result(timeout=5) == "job2.mp4"
+
+
+def test_rejected_submission_fails_at_once(jobs, monkeypatch):
+    monkeypatch.setattr(video, "submit_synthesis", lambda job_id, transcript: False)
+    poller = AvatarPoller(initial_delay=0.01, max_delay=0.05)
+
+    with pytest.raises(RuntimeError, match="Failed to submit"):
+        poller.submit("transcript").result(timeout=0)
+    assert not poller.jobs
+
+
+class FlakyFileServer:
+    """Serves data with Range support, cutting the first transfer off after cut_at bytes."""
+
+    def __init__(self, data, cut_at, ranges=True):
+        self.data = data
+        self.cut_at = cut_at
+        self.ranges = ranges
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                server.requests.append(self.headers.get("Range"))
+                match = re.fullmatch(r"bytes=(\d+)-", self.headers.get("Range") or "")
+                start = int(match.group(1)) if match and server.ranges else 0
+                body = server.data[start:]
+                self.send_response(206 if start else 200)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if len(server.requests) == 1:
+                    # the connection breaks halfway
+                    self.wfile.write(body[:server.cut_at])
+                    self.close_connection = True
+                    return
+                self.wfile.write(body)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/files/video.mp4"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(video.time, "sleep", lambda seconds: None)
+
+
+@pytest.mark.parametrize("ranges", [True, False])
+def test_interrupted_download_is_resumed(tmp_path, no_backoff, ranges):
+    data = bytes(range(256)) * 4096
+    server = FlakyFileServer(data, cut_at=300000, ranges=ranges)
+    try:
+        target = str(tmp_path / "video.mp4")
+        assert video.download_video(server.url, target) == target
+    finally:
+        server.httpd.shutdown()
+
+    with open(target, "rb") as file:
+        assert file.read() == data
+    # the second request asks for the rest of what was written
+    assert server.requests[0] is None
+    resumed_at = int(re.fullmatch(r"bytes=(\d+)-", server.requests[1]).group(1))
+    assert 0 < resumed_at <= 300000
+    assert len(server.requests) == 2
+    # the partial file is gone
+    assert [path.name for path in tmp_path.iterdir()] == ["video.mp4"]
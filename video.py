@@ -1,101 +1,329 @@
-import sys
-import getpass
 import os
-import bs4
-import markdownify
-import re
-import requests
-import azure.cognitiveservices.speech as speechsdk
-import logging
 import uuid
+import contextvars
+import hashlib
 import json
 import time
-from pptx import Presentation
-from pptx.util import Inches, Cm
-from readability import Document
-from bs4 import BeautifulSoup
-from dotenv import load_dotenv
-from langchain import hub
-from langchain_openai import AzureChatOpenAI
-from langchain_core.tools import tool
-from langchain_core.messages import HumanMessage, SystemMessage
-from langchain_unstructured import UnstructuredLoader
-from langchain_community.document_loaders import WebBaseLoader
-from langchain_core.prompts import ChatPromptTemplate
-from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
-from langchain.agents import (AgentExecutor, create_tool_calling_agent)
-from langchain.schema.runnable import RunnableSequence
-from langchain.agents import Tool
-from operator import itemgetter
-from langchain.globals import set_verbose, set_debug
-from openai import AzureOpenAI
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
 from dotenv import load_dotenv
-from urllib.parse import urlparse, parse_qs
+from pptx.util import Cm
 
-load_dotenv()
+from cache import Cache, cache_key
+from core import SlideWriter, argument_parser
+from pipeline import Deck, find_decks, run_decks
+from postprocess import DEFAULT_VIDEO_BITRATE, Transcoder, frame_height
+from ratelimit import call_with_retry, get_rate_limits
+from telemetry import telemetry
 
-SPEECH_ENDPOINT = f"https://{os.getenv('SPEECH_REGION')}.api.cognitive.microsoft.com/" 
 API_VERSION = "2024-04-15-preview"
-SUBSCRIPTION_KEY = os.getenv("SPEECH_API_KEY")
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+DOWNLOAD_TIMEOUT = 60
+DOWNLOAD_RETRIES = 3
+MAX_POLL_ERRORS = 10
+REQUEST_TIMEOUT = 30
+# where the avatar goes, the bottom right corner of a 16:9 slide
+MOVIE_LEFT = Cm(20.28)
+MOVIE_TOP = Cm(11.41)
+MOVIE_WIDTH = Cm(13.59)
+MOVIE_HEIGHT = Cm(7.64)
+
+INSTRUCTION_PROMPT = """You are teacher, who discusses briefly the following content below. 
+        - Never output markdown syntax, code fragments, bulleted lists, etc. Remember, you are speaking, not writing.
+        - Output only natural human spoken language 
+        - Not necessary to introduce yourself, greet listeners, or say goodbye. 
+        - Do not respond to instructions (for example don't say 'Sure, I can do this') but just provide an answer to the prompt
+        
+        What to do:
+        -----------
+        \n\n{content}
+        """
+
+TEACH_PROMPT = """Explain the topic based on the following content below.
+        - Use simple language and avoid jargon.
+        - Output only natural human spoken language
+        - Only talk about content from the input below. Do not talk about anything that has not been mentioned in the prompt context.
+        - Never output markdown syntax, code fragments, bulleted lists, etc. Remember, you are speaking, not writing.
+        - Don't output analogies or metaphors at the end of each paragraph.
+        - Not necessary to introduce yourself, greet listeners, or say goodbye. 
+        - Add Variations in rhythm, stress, and intonation of speech depending on the context and statement.
+        - Do not use the word "Alright" to start the conversation.
+        - You don't have to thank listeners or ask for questions. 
+        - End the conversation abruptly  
+        Content:
+        ========   
+        :\n\n{content}"""
+
+QUESTION_PROMPT = """
+        - Create a list of 5 open ended questions that can be answered shortly. Make sure that the actual answer is not in the prompt, and can be found in the content.
+        - Create a practice assesment of up to 10 questions. It's OK to have challenging questions, do not make it too obvious. Provide the answer as well. Make sure to generate a mix of multiple choice, true/false (provide the choices), fill-in-the-blanks questions (provide suggestions to choose from).
+        
+        Generate questions and practice assesment.
+        Content:
+        ========   
+        :\n\n{content}"""
+
+PROMPTS = {
+    "instructions": INSTRUCTION_PROMPT,
+    "teach": TEACH_PROMPT,
+    "questions": QUESTION_PROMPT,
+}
+
+
+def speech_endpoint():
+    """The Speech resource endpoint, $SPEECH_ENDPOINT or derived from $SPEECH_REGION, read when it is first needed."""
+    return os.getenv("SPEECH_ENDPOINT") or f"https://{os.getenv('SPEECH_REGION')}.api.cognitive.microsoft.com/"
+
+
+def generate_video(transcript: str, log=None):
+    job_id = reattach_synthesis(log)
+    if job_id is None:
+        job_id = str(uuid.uuid4())
+        if not submit_synthesis(job_id, transcript):
+            raise RuntimeError(f"Failed to submit batch avatar synthesis job {job_id}")
+        if log is not None:
+            log.record("submitted", job_id=job_id)
+
+    submitted = time.time()
+    running = None
+    errors = 0
+    while True:
+        try:
+            job = get_synthesis(job_id)
+        except requests.RequestException as e:
+            print(f'- Failed to get batch synthesis job {job_id}: {e}')
+            job = None
+        status = job['status'] if job else None
+        if status == 'Running' and running is None:
+            running = time.time()
+            telemetry.record("avatar:queue", submitted, running)
+        if status == 'Succeeded':
+            print('- batch avatar synthesis job succeeded')
+            telemetry.record("avatar:render", running or submitted, time.time())
+            download_url = job["outputs"]["result"]
+            with telemetry.span("avatar:download"):
+                local_url = download_video(download_url, f"{job_id}.mp4")
+            print('- Download url: ' + download_url)
+            return local_url
+        elif status == 'Failed':
+            print('- batch avatar synthesis job failed')
+            if log is not None:
+                # nothing left to reattach to, a resumed run submits a new job
+                log.record("submitted", job_id=None)
+            raise RuntimeError(f"Batch avatar synthesis job {job_id} failed")
+
+        errors = errors + 1 if job is None else 0
+        if errors >= MAX_POLL_ERRORS:
+            raise RuntimeError(f"Giving up on batch avatar synthesis job {job_id} after {errors} failed status checks")
+        print(f'- batch avatar synthesis job is still running, status [{status}]')
+        time.sleep(5)
+
+def reattach_synthesis(log):
+    """Return the ID of the avatar job an interrupted run submitted for this slide, if any."""
+    submitted = log.get("submitted") if log is not None else None
+    if submitted is None or submitted["job_id"] is None:
+        return None
+    print(f'- Reattaching to batch avatar synthesis job {submitted["job_id"]}')
+    return submitted["job_id"]
+
+class AvatarPoller:
+    """Tracks all outstanding batch avatar synthesis jobs from one thread.
 
-@tool
-def retrieve_html(url):
-    """Retrieve a website by it's HTTP url and return the HTML content."""
-    print(f"Retrieving HTML from {url}")
-    response = requests.get(url)
+    Jobs are submitted up front with submit(), which returns a Future for the local mp4.
+    The poller checks every outstanding job per round, backing off exponentially
+    (initial_delay doubling up to max_delay) while nothing changes, and downloads each
+    video as soon as its job succeeds. With a cache, videos rendered before are not
+    submitted again and new downloads are added to the cache. With a slide journal,
+    jobs submitted by an interrupted run are reattached instead of submitted again.
+    """
 
-    doc = Document(response.content)
+    def __init__(self, initial_delay=5, max_delay=60, download_workers=4, cache=None):
+        self.cache = cache
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.jobs = {}
+        self.submitted = False
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.downloads = ThreadPoolExecutor(max_workers=download_workers)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
 
-    markdown = markdownify.markdownify(str(doc.summary()), heading_style="ATX")
-    markdown = re.sub('\n{3,}', '\n\n', markdown)
-    markdown = markdown.replace("[Continue](/en-us/)", "")
+    def submit(self, transcript: str, log=None):
+        future = Future()
+        key = avatar_cache_key(transcript)
+        if self.cache is not None:
+            cached = self.cache.get_file(key, ".mp4", pin=True)
+            if cached is not None:
+                future.set_result(cached)
+                return future
 
-    return markdown
+        job_id = reattach_synthesis(log)
+        if job_id is None:
+            job_id = str(uuid.uuid4())
+            if not submit_synthesis(job_id, transcript):
+                future.set_exception(RuntimeError(f"Failed to submit batch avatar synthesis job {job_id}"))
+                return future
+            if log is not None:
+                log.record("submitted", job_id=job_id)
 
+        with self.lock:
+            # the poller thread records spans and downloads in the context of the submitting slide
+            self.jobs[job_id] = {"future": future, "key": key, "log": log, "errors": 0,
+                                 "context": contextvars.copy_context(), "submitted": time.time(), "running": None}
+            self.submitted = True
+            self.wakeup.set()
+        return future
 
-def generate_video(transcript: str):
-    job_id = str(uuid.uuid4())
-    download_url = None
-    if submit_synthesis(job_id, transcript):
+    def _run(self):
+        delay = self.initial_delay
         while True:
-            status = get_synthesis(job_id)
-            if status == 'Succeeded':
-                print('- batch avatar synthesis job succeeded')
-                download_url = getdownloadurl(job_id)
-                local_url = f"{job_id}.mp4"
-                
-                response = requests.get(download_url)
-                with open(local_url, 'wb') as file:
-                    file.write(response.content)
-                        
-                print('- Download url: ' + download_url)
-                break
-            elif status == 'Failed':
-                print('- batch avatar synthesis job failed')
-                break
-            else:
-                print(f'- batch avatar synthesis job is still running, status [{status}]')
-                time.sleep(5)
-
-    return local_url
-
-def download_video(url: str):
-    parsed_url = urlparse(url)
-    filename = os.path.basename(parsed_url.path)
-    
-    response = requests.get(url)
-    with open(filename, 'wb') as file:
-        file.write(response.content)
-        
+            # the event stays set for as long as there are outstanding jobs
+            self.wakeup.wait()
+            with self.lock:
+                if not self.jobs:
+                    self.wakeup.clear()
+                    continue
+                if self.submitted:
+                    self.submitted = False
+                    delay = self.initial_delay
+
+            time.sleep(delay)
+
+            with self.lock:
+                pending = dict(self.jobs)
+
+            changed = False
+            for job_id, job_state in pending.items():
+                try:
+                    changed = self._check(job_id, job_state) or changed
+                except Exception as e:
+                    # a malformed response must not kill the poller, every other job would wait forever
+                    print(f'- Failed to check batch synthesis job {job_id}: {e!r}')
+                    self._fail(job_id, job_state, RuntimeError(f"Checking batch avatar synthesis job {job_id} failed: {e!r}"))
+                    changed = True
+
+            delay = self.initial_delay if changed else min(delay * 2, self.max_delay)
+            with self.lock:
+                running = len(self.jobs)
+            if running:
+                print(f'- {running} batch avatar synthesis job(s) still running, next check in {delay}s')
+
+    def _check(self, job_id, job_state):
+        """Check one job, return whether it finished."""
+        try:
+            job = get_synthesis(job_id)
+        except requests.RequestException as e:
+            print(f'- Failed to get batch synthesis job {job_id}: {e}')
+            job = None
+        status = job['status'] if job else None
+        if status == 'Running' and job_state["running"] is None:
+            job_state["running"] = time.time()
+            job_state["context"].copy().run(telemetry.record, "avatar:queue", job_state["submitted"], job_state["running"])
+        if status == 'Succeeded':
+            print(f'- batch avatar synthesis job {job_id} succeeded')
+            download_url = job["outputs"]["result"]
+            job_state["context"].copy().run(telemetry.record, "avatar:render",
+                                            job_state["running"] or job_state["submitted"], time.time())
+            self._done(job_id)
+            self.downloads.submit(job_state["context"].copy().run, self._download, job_id, download_url, job_state)
+            return True
+        if status == 'Failed':
+            print(f'- batch avatar synthesis job {job_id} failed')
+            self._fail(job_id, job_state, RuntimeError(f"Batch avatar synthesis job {job_id} failed"), forget=True)
+            return True
+        if job is None:
+            job_state["errors"] += 1
+            if job_state["errors"] >= MAX_POLL_ERRORS:
+                self._fail(job_id, job_state, RuntimeError(
+                    f"Giving up on batch avatar synthesis job {job_id} after {job_state['errors']} failed status checks"))
+                return True
+            return False
+        job_state["errors"] = 0
+        return False
+
+    def _done(self, job_id):
+        with self.lock:
+            self.jobs.pop(job_id, None)
+
+    def _fail(self, job_id, job_state, error, forget=False):
+        self._done(job_id)
+        if forget and job_state["log"] is not None:
+            # nothing left to reattach to, a resumed run submits a new job
+            job_state["log"].record("submitted", job_id=None)
+        if not job_state["future"].done():
+            job_state["future"].set_exception(error)
+
+    def _download(self, job_id, download_url, job_state):
+        try:
+            with telemetry.span("avatar:download"):
+                mp4 = download_video(download_url, f"{job_id}.mp4")
+            if self.cache is not None:
+                mp4 = self.cache.put_file(job_state["key"], ".mp4", mp4, pin=True)
+            if job_state["log"] is not None:
+                job_state["log"].record("media", path=os.path.abspath(mp4))
+            job_state["future"].set_result(mp4)
+        except Exception as e:
+            job_state["future"].set_exception(e)
+
+def download_video(url: str, filename: str = None):
+    """Streams url to filename in chunks, resuming with an HTTP Range request when the transfer breaks.
+
+    The data goes to a unique temporary file first and is checksummed while it streams,
+    the file is only moved to filename once it is complete.
+    """
+    if filename is None:
+        parsed_url = urlparse(url)
+        filename = os.path.basename(parsed_url.path)
+
+    tmp_filename = f"{filename}.{uuid.uuid4()}.part"
+    sha256 = hashlib.sha256()
+    written = 0
+    attempt = 0
+    try:
+        with open(tmp_filename, 'wb') as file:
+            while True:
+                headers = {'Range': f'bytes={written}-'} if written else {}
+                try:
+                    with requests.get(url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+                        response.raise_for_status()
+                        if written and response.status_code != 206:
+                            # the server ignored the range, start over
+                            file.seek(0)
+                            file.truncate()
+                            sha256 = hashlib.sha256()
+                            written = 0
+
+                        length = response.headers.get('Content-Length')
+                        expected = written + int(length) if length else None
+                        for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                            file.write(chunk)
+                            sha256.update(chunk)
+                            written += len(chunk)
+
+                        if expected is not None and written < expected:
+                            raise requests.ConnectionError(f"connection closed after {written:,} of {expected:,} bytes")
+                    break
+                except requests.RequestException as e:
+                    attempt += 1
+                    if attempt > DOWNLOAD_RETRIES:
+                        raise
+                    print(f'- Download of {filename} interrupted at {written:,} bytes ({e}), resuming')
+                    time.sleep(2 ** attempt)
+
+        os.replace(tmp_filename, filename)
+    finally:
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+
+    print(f'- Downloaded {filename} ({written:,} bytes, sha256 {sha256.hexdigest()})')
+    telemetry.add("bytes", written)
     return filename
 
-def submit_synthesis(job_id: str, transcript: str):
-    url = f'{SPEECH_ENDPOINT}/avatar/batchsyntheses/{job_id}?api-version={API_VERSION}'
-    header = {
-        'Content-Type': 'application/json',
-        'Ocp-Apim-Subscription-Key': SUBSCRIPTION_KEY
-    }
+def synthesis_payload(transcript: str):
     isCustomized = False
 
     payload = {
@@ -146,8 +374,22 @@ def submit_synthesis(job_id: str, transcript: str):
             # "backgroundImage": "https://samples-files.com/samples/Images/jpg/1920-1080-sample.jpg", # background image URL, only support https, either backgroundImage or backgroundColor can be set
         }  
     }
+    return payload
+
+def avatar_cache_key(transcript: str):
+    return cache_key("avatar", API_VERSION, synthesis_payload(transcript))
 
-    response = requests.put(url, json.dumps(payload), headers=header)
+def submit_synthesis(job_id: str, transcript: str):
+    url = f'{speech_endpoint()}/avatar/batchsyntheses/{job_id}?api-version={API_VERSION}'
+    header = {
+        'Content-Type': 'application/json',
+        'Ocp-Apim-Subscription-Key': os.getenv("SPEECH_API_KEY")
+    }
+    payload = synthesis_payload(transcript)
+
+    with telemetry.span("avatar:submit"):
+        response = call_with_retry(lambda: requests.put(url, json.dumps(payload), headers=header, timeout=REQUEST_TIMEOUT),
+                                   [(get_rate_limits().avatar, 1)])
     if response.status_code < 400:
         print('- Batch avatar synthesis job submitted successfully')
         print(f'Job ID: {response.json()["id"]}')
@@ -158,162 +400,91 @@ def submit_synthesis(job_id: str, transcript: str):
 
 
 def get_synthesis(job_id):
-    url = f'{SPEECH_ENDPOINT}/avatar/batchsyntheses/{job_id}?api-version={API_VERSION}'
+    url = f'{speech_endpoint()}/avatar/batchsyntheses/{job_id}?api-version={API_VERSION}'
     header = {
         'Content-Type': 'application/json',
-        'Ocp-Apim-Subscription-Key': SUBSCRIPTION_KEY
+        'Ocp-Apim-Subscription-Key': os.getenv("SPEECH_API_KEY")
     }
 
-    response = requests.get(url, headers=header)
+    response = call_with_retry(lambda: requests.get(url, headers=header, timeout=REQUEST_TIMEOUT), [(get_rate_limits().avatar, 1)])
     if response.status_code < 400:
         print('- Get batch synthesis job successfully')
-        #print(response.json())
-        if response.json()['status'] == 'Succeeded':
-            print(f'Batch synthesis job succeeded, download URL: {response.json()["outputs"]["result"]}')
-        return response.json()['status']
+        job = response.json()
+        if job['status'] == 'Succeeded':
+            print(f'Batch synthesis job succeeded, download URL: {job["outputs"]["result"]}')
+        return job
     else:
         print(f'- Failed to get batch synthesis job: {response.text}')
 
-def getdownloadurl(job_id):
-    url = f'{SPEECH_ENDPOINT}/avatar/batchsyntheses/{job_id}?api-version={API_VERSION}'
-    header = {
-        'Content-Type': 'application/json',
-        'Ocp-Apim-Subscription-Key': SUBSCRIPTION_KEY
-    }
-
-    response = requests.get(url, headers=header)
-    if response.status_code < 400:
-        print('- Get batch synthesis job successfully')
-        #print(response.json())
-        if response.json()['status'] == 'Succeeded':
-            return response.json()["outputs"]["result"]
-    else:
-        print(f'- Failed to get batch synthesis job: {response.text}')
 
+def parse_args():
+    parser = argument_parser("Add a generated avatar video to every slide of one or more PowerPoint decks.", "-video", "the avatar API")
+    parser.add_argument("--batch-avatar", action="store_true",
+                        help="submit the avatar jobs of all slides up front and track them with one shared poller")
+    parser.add_argument("--transcode", action="store_true",
+                        help="scale the avatar videos down to the size they are shown at and re-encode them with ffmpeg before embedding")
+    parser.add_argument("--video-bitrate", default=os.getenv("VIDEO_BITRATE", DEFAULT_VIDEO_BITRATE),
+                        help="video bitrate of --transcode (default: $VIDEO_BITRATE or %(default)s)")
+    parser.add_argument("--poster-frame", action="store_true",
+                        help="with --transcode, show a frame of the video before it plays instead of a blank box")
+    parser.add_argument("--transcode-workers", type=int, default=os.getenv("TRANSCODE_WORKERS"),
+                        help="number of ffmpeg processes run at a time (default: $TRANSCODE_WORKERS or one per CPU)")
+    return parser.parse_args()
 
 def main():
-    set_verbose(True)
-    set_debug(False)
     load_dotenv()
+    args = parse_args()
+    telemetry.open(args.spans)
+
+    cache = Cache(None if args.no_cache else args.cache_dir, max_bytes=args.cache_max_mb * 1024 * 1024)
+    writer = SlideWriter(PROMPTS, cache, llm_url_tool=args.llm_url_tool)
+
+    def process_slide(i, notes, log, deck):
+        text_response, notes_text = writer.write(i, notes, log)
 
-    llm = AzureChatOpenAI(
-        azure_endpoint=os.environ["AZURE_OPENAI_ENDPOINT"],
-        azure_deployment=os.environ["AZURE_OPENAI_DEPLOYMENT_NAME"],
-        openai_api_version=os.environ["AZURE_OPENAI_API_VERSION"],
-    )
-
-    retrieve_html_tool = Tool(
-        name="retrieve_html",
-        func=retrieve_html,
-        description="Fetches content from a provided URL"
-    )
-    
-    llm_with_tools = llm.bind_tools([retrieve_html_tool])
-    
-    retrieve_html_template = PromptTemplate(
-        input_variables=["content"],
-        template="Fetches content from a provided URL by using the retrieve_html tool:\n\n{content}"
-    )
-    
-    instruction_template = PromptTemplate(
-        input_variables=["content"],
-        template="""You are teacher, who discusses briefly the following content below. 
-        - Never output markdown syntax, code fragments, bulleted lists, etc. Remember, you are speaking, not writing.
-        - Output only natural human spoken language 
-        - Not necessary to introduce yourself, greet listeners, or say goodbye. 
-        - Do not respond to instructions (for example don't say 'Sure, I can do this') but just provide an answer to the prompt
-        
-        What to do:
-        -----------
-        \n\n{content}
-        """
-    )
-    
-    teach_template = PromptTemplate(
-        input_variables=["content"],
-        template="""Explain the topic based on the following content below.
-        - Use simple language and avoid jargon.
-        - Output only natural human spoken language
-        - Only talk about content from the input below. Do not talk about anything that has not been mentioned in the prompt context.
-        - Never output markdown syntax, code fragments, bulleted lists, etc. Remember, you are speaking, not writing.
-        - Don't output analogies or metaphors at the end of each paragraph.
-        - Not necessary to introduce yourself, greet listeners, or say goodbye. 
-        - Add Variations in rhythm, stress, and intonation of speech depending on the context and statement.
-        - Do not use the word "Alright" to start the conversation.
-        - You don't have to thank listeners or ask for questions. 
-        - End the conversation abruptly  
-        Content:
-        ========   
-        :\n\n{content}"""
-    )
-    
-    question_template = PromptTemplate(
-        input_variables=["content"],
-        template="""
-        - Create a list of 5 open ended questions that can be answered shortly. Make sure that the actual answer is not in the prompt, and can be found in the content.
-        - Create a practice assesment of up to 10 questions. It's OK to have challenging questions, do not make it too obvious. Provide the answer as well. Make sure to generate a mix of multiple choice, true/false (provide the choices), fill-in-the-blanks questions (provide suggestions to choose from).
-        
-        Generate questions and practice assesment.
-        Content:
-        ========   
-        :\n\n{content}"""
-    )
-    
-    pptx_input = "pptx/MS-4005-ENU-PowerPoint_01.pptx"
-    pptx_output = "pptx/MS-4005-ENU-PowerPoint_01-video.pptx"
-
-    presentation = Presentation(pptx_input)
-    i = 1
-    for slide in presentation.slides:
-        if slide.notes_slide is None:
-            print(f"Skipping slide {i}")
-            continue
-        
-        notes = slide.notes_slide.notes_text_frame.text
-        if notes == "":
-            print(f"Skipping slide {i}")
-            continue    
-    
-        print(f"Processing slide {i}")
-        
-        url_pattern = r"https?://[^\s]+"
-        urls = re.findall(url_pattern, notes)
-        if urls:
-            # Define the pipeline
-            print("chain: content (url)")
-            content_chain = llm_with_tools | (lambda x: x.tool_calls[0]["args"]) | retrieve_html_tool
-            content_response = content_chain.invoke(notes)
-            
-            print("chain: teaching")
-            teach_chain = teach_template | llm 
-            text_response = teach_chain.invoke({"content": notes + "\n\n" + content_response})
-            
-            print("chain: questioning")
-            question_chain = question_template | llm
-            question_response = question_chain.invoke({"content": notes + "\n\n" + content_response})
-            slide.notes_slide.notes_text_frame.text = question_response.content
-        else:
-            print("chain: instructions")
-            instruction_chain = instruction_template | llm 
-            text_response = instruction_chain.invoke({"content": notes})
-            slide.notes_slide.notes_text_frame.text = ""
-        
-        print(str(text_response.content))
         # Save the video
-        print("chain: video")
-        mp4 = generate_video(str(text_response.content))
+        print(f"slide {i}: chain: video")
+        # media is pinned in the cache until the slide is embedded, so a full cache does not evict it before
+        media = log.get("media")
+        if poller is not None and not (media is not None and cache.pin(media["path"])):
+            # don't wait for the render here, embed_slide() picks up the mp4 once it is downloaded
+            mp4 = poller.submit(text_response, log)
+        elif poller is not None:
+            mp4 = media["path"]
+        else:
+            mp4 = log.file("media", lambda: cache.file(avatar_cache_key(text_response), ".mp4",
+                                                        lambda: generate_video(text_response, log), pin=True),
+                           keep=cache.pin)
+        if transcoder is not None:
+            # ffmpeg runs on its own pool, this worker moves on to the next slide
+            mp4 = transcoder.submit(mp4, frame_height(MOVIE_HEIGHT, deck.slide_height), log)
+        return mp4, notes_text
 
-        left = Cm(20.28)
-        top = Cm(11.41)
-        width = Cm(13.59)
-        height = Cm(7.64)
+    def embed_slide(slide, mp4, notes_text, embedder):
+        slide.notes_slide.notes_text_frame.text = notes_text
 
-        movie = slide.shapes.add_movie(mp4, left, top, width, height, poster_frame_image=None, mime_type='video/mp4')
+        poster = transcoder.poster_frame(mp4) if transcoder is not None else None
+        movie = embedder.add_movie(slide, mp4, MOVIE_LEFT, MOVIE_TOP, MOVIE_WIDTH, MOVIE_HEIGHT,
+                                   poster_frame_image=poster, mime_type='video/mp4')
         movie.media_format.auto_play = True
-        
-        i = i + 1
-        
-        presentation.save(pptx_output)
+
+    transcoder = None
+    if args.transcode:
+        transcoder = Transcoder(bitrate=args.video_bitrate, poster=args.poster_frame, workers=args.transcode_workers,
+                                cache=cache)
+        if not transcoder.available:
+            print("ffmpeg not found on PATH, embedding the avatar videos as rendered")
+            transcoder = None
+
+    poller = AvatarPoller(cache=cache) if args.batch_avatar else None
+    decks = [Deck(pptx_input, pptx_output, save_every=args.save_every, save_interval=args.save_interval, resume=args.resume,
+                  low_memory=args.low_memory, cache=cache)
+             for pptx_input, pptx_output in find_decks(args.decks, "-video", output_dir=args.output_dir)]
+    run_decks(decks, process_slide, embed_slide, workers=args.workers, incremental=args.incremental)
+    if transcoder is not None:
+        print(transcoder.summary())
+    print(cache.summary())
+    telemetry.report()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file